@@ -14,59 +14,73 @@
 #  DB 12   ; a decimal byte
 #  DB 0b0001 ; a binary byte
 
+import os
 import sys
 import re
 
-# Opcodes
-OPCODES = {
-    "ADD":  {"type": 2, "code": "10100000"},
-    "AND":  {"type": 2, "code": "10101000"},
-    "CALL": {"type": 1, "code": "01010000"},
-    "CMP":  {"type": 2, "code": "10100111"},
-    "DEC":  {"type": 1, "code": "01100110"},
-    "DIV":  {"type": 2, "code": "10100011"},
-    "HLT":  {"type": 0, "code": "00000001"},
-    "INC":  {"type": 1, "code": "01100101"},
-    "INT":  {"type": 1, "code": "01010010"},
-    "IRET": {"type": 0, "code": "00010011"},
-    "JEQ":  {"type": 1, "code": "01010101"},
-    "JGE":  {"type": 1, "code": "01011010"},
-    "JGT":  {"type": 1, "code": "01010111"},
-    "JLE":  {"type": 1, "code": "01011001"},
-    "JLT":  {"type": 1, "code": "01011000"},
-    "JMP":  {"type": 1, "code": "01010100"},
-    "JNE":  {"type": 1, "code": "01010110"},
-    "LD":   {"type": 2, "code": "10000011"},
-    "LDI":  {"type": 8, "code": "10000010"},
-    "MOD":  {"type": 2, "code": "10100100"},
-    "MUL":  {"type": 2, "code": "10100010"},
-    "NOP":  {"type": 0, "code": "00000000"},
-    "NOT":  {"type": 1, "code": "01101001"},
-    "OR":   {"type": 2, "code": "10101010"},
-    "POP":  {"type": 1, "code": "01000110"},
-    "PRA":  {"type": 1, "code": "01001000"},
-    "PRN":  {"type": 1, "code": "01000111"},
-    "PUSH": {"type": 1, "code": "01000101"},
-    "RET":  {"type": 0, "code": "00010001"},
-    "SHL":  {"type": 2, "code": "10101100"},
-    "SHR":  {"type": 2, "code": "10101101"},
-    "ST":   {"type": 2, "code": "10000100"},
-    "SUB":  {"type": 2, "code": "10100001"},
-    "XOR":  {"type": 2, "code": "10101011"},
-}
-
-# Regex for matching lines
+# The .ls8b image format and the instruction set live with the emulator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "ls8"))
+
+from image import Image, write_image
+from isa import INSTRUCTIONS
+
+# Bumped whenever the same source would assemble to different output, so
+# build.py's cache misses
+ASSEMBLER_VERSION = 2
+
+# Assembler operand type of each operand form: 0, 1 or 2 registers, or 8
+# for a register and an immediate (LDI)
+FORM_TYPES = {"": 0, "r": 1, "rr": 2, "ri": 8}
+
+# Mnemonic -> (type, opcode byte), from the instruction set table the
+# emulator is built from
+ENCODINGS = {name: (FORM_TYPES[form], code)
+             for name, code, form in INSTRUCTIONS}
+
+# Regex for matching lines, run on the uppercased line
 # Capturing groups: label, opcode, operandA, operandB
-REGEX = r"(?:(\w+?):)?\s*(?:(\w+)\s*(?:(\w+)(?:\s*,\s*(\w+))?)?)?"
+REGEX = re.compile(r"(?:(\w+?):)?\s*(?:(\w+)\s*(?:(\w+)(?:\s*,\s*(\w+))?)?)?")
+
+# Regex for capturing DS and DB data, run on the line as written
+REGEX_DS = re.compile(r"(?:(\w+?):)?\s*DS\s*(.+)", re.IGNORECASE)
+REGEX_DB = re.compile(r"(?:(\w+?):)?\s*DB\s*(.+)", re.IGNORECASE)
+
+# Register operands, e.g. "R2"
+REGEX_REG = re.compile(r"R([0-7])")
+
+
+class AsmError(Exception):
+    """An error in the source; status is the exit status asm.py gives."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class Program:
+    """
+    The output of one assembly pass: the machine code, the symbol table,
+    and what the text listing needs to annotate the code with.
+    """
 
-# Regex for capturing DS and DB data
-REGEX_DS = r"(?:(\w+?):)?\s*DS\s*(.+)"  # insensitive
-REGEX_DB = r"(?:(\w+?):)?\s*DB\s*(.+)"  # insensitive
+    def __init__(self):
+        # machine code, with label operands backpatched
+        self.code = bytearray()
+        # {label: address}
+        self.sym = {}
+        # address -> (opcode, op_a, op_b) of an instruction, or the comment
+        # text of a DS or DB byte
+        self.notes = {}
+        # (address, label) in source order
+        self.labels = []
 
 
 def parse_commandline(argv):
     """
     Usage: asm.py [inputfile] [outputfile]
+
+    An outputfile ending in .ls8b gets a binary image instead of text.
     """
 
     if len(argv) == 1:
@@ -82,13 +96,14 @@ def parse_commandline(argv):
         outputfile = argv[2]
 
     else:
-        print("usage: asm.py [infile.asm] [outfile.ls8]", file=sys.stderr)
+        print("usage: asm.py [infile.asm] [outfile.ls8|outfile.ls8b]",
+              file=sys.stderr)
         sys.exit(1)
 
     return inputfile, outputfile
 
 
-def open_files(inputfile, outputfile):
+def open_files(inputfile, outputfile, binary=False):
     """
     Open files for reading and writing. If either of the files are named "-",
     stdin or stdout is returned as appropriate.
@@ -100,220 +115,57 @@ def open_files(inputfile, outputfile):
         inputfile = open(inputfile)
 
     if outputfile == "-":
-        outputfile = sys.stdout
+        outputfile = sys.stdout.buffer if binary else sys.stdout
     else:
-        outputfile = open(outputfile, "w")
+        outputfile = open(outputfile, "wb" if binary else "w")
 
     return inputfile, outputfile
 
 
-def normalize_line(groups):
-    """
-    Takes match groups and uppercases them if they're not None.
-    """
-
-    result = []
-
-    for g in groups:
-        if g is None:
-            result.append(None)
-        else:
-            result.append(g.upper())
-
-    return result
-
-
 def p8(v):
     return "{:08b}".format(v)
 
 
-def pass1(inputfile, sym, code):
+def assemble_lines(lines):
     """
-    Pass 1
+    Assemble source lines in a single pass and return the Program.
 
-    * Read the source code lines
     * Parse labels, opcodes, and operands
-    * Record label offsets
-    * Emit machine code
+    * Record label addresses
+    * Emit machine code, leaving a zero and a fixup wherever an operand
+      names a label
+    * Backpatch the label addresses into the fixups at the end
+
+    Addresses and immediates are bytes and wrap at 256, as the pc does.
+    Raises AsmError for the first error in the source.
     """
 
-    # Source line number
-    line_num = 0
+    program = Program()
+    code = program.code
+    sym = program.sym
+    notes = program.notes
+    labels = program.labels
 
-    # Current code address (for labels)
-    addr = 0
+    # (code address, label, line number) of each label operand
+    fixups = []
 
-    def get_reg(op, fatal=True):
-        """Get a register number from a string, e.g. "R2" -> 2"""
+    match_line = REGEX.match
+    match_reg = REGEX_REG.match
+    encodings = ENCODINGS
 
-        nonlocal line_num
+    def get_reg(op, line_num):
+        """Get a register number from a string, e.g. "R2" -> 2"""
 
-        m = re.match(r"R([0-7])", op)
+        m = match_reg(op)
 
         if m is None:
-            if fatal:
-                print(f"Line {line_num}: unknown register {op}",
-                      file=sys.stderr)
-                sys.exit(1)
-            else:
-                return None
+            raise AsmError(f"Line {line_num}: unknown register {op}", 1)
 
         return int(m.group(1))
 
-    def out0(opcode, op_a, op_b, machine_code):
-        """Handle opcodes with zero operands"""
-
-        nonlocal addr
-
-        code.append(f"{machine_code} # {opcode}")
-        addr += 1
-
-    def out1(opcode, op_a, op_b, machine_code):
-        """Handle opcodes with one operand"""
-
-        nonlocal addr
-
-        reg_a = get_reg(op_a)
-        code.append(f"{machine_code} # {opcode} {op_a}")
-        code.append(p8(reg_a))
-        addr += 2
-
-    def out2(opcode, op_a, op_b, machine_code):
-        """Handle opcodes with two operands"""
-
-        nonlocal addr
-
-        reg_a = get_reg(op_a)
-        reg_b = get_reg(op_b)
-
-        code.append(f"{machine_code} # {opcode} {op_a},{op_b}")
-        code.append(p8(reg_a))
-        code.append(p8(reg_b))
-
-        addr += 3
-
-    def out8(opcode, op_a, op_b, machine_code):
-        """Handle LDI opcode (type 8)"""
-
-        nonlocal addr
-
-        reg_a = get_reg(op_a)
-
-        try:
-            val_b = int(op_b, 0)
-            out_b = p8(val_b)
-
-        except ValueError:
-            # If it's not a value, it might be a symbol
-            out_b = f"sym:{op_b}"
-
-        code.append(f"{machine_code} # {opcode} {op_a},{op_b}")
-        code.append(p8(reg_a))
-        code.append(out_b)
-
-        addr += 3
-
-    def handle_ds(line):
-        """
-        Handle DS pseudo-opcode
-        """
-
-        nonlocal addr
-
-        m = re.match(REGEX_DS, line, re.IGNORECASE)
-
-        if m is None or m.group(2) is None:
-            print(f"line {line_num}: missing argument to DS", file=sys.stderr)
-            sys.exit(2)
-
-        data = m.group(2)
-
-        for i in range(len(data)):
-            print_char = data[i]
-
-            if print_char == ' ':
-                print_char = '[space]'
-
-            code.append(f"{p8(ord(data[i]))} # {print_char}")
-
-        addr += len(data)
-
-    def handle_db(line):
-        """
-        Handle the DB pseudo-opcode
-        """
-
-        nonlocal addr
-
-        m = re.match(REGEX_DB, line, re.IGNORECASE)
-
-        if m is None or m.group(2) is None:
-            print(f"line {line}: missing argument to DB", file=sys.stderr)
-            sys.exit(2)
-
-        data = m.group(2)
-
-        try:
-            val = int(data, 0)
-
-        except ValueError:
-            print(f"line {line_num}: invalid integer argument to DB",
-                  file=sys.stderr)
-            sys.exit(2)
-
-        # Force to byte size
-        val &= 0xff
-
-        code.append(f"{p8(val)} # {data}")
-
-        addr += 1
-
-    def check_ops(opcode, op_a, op_b):
-        """Check operands for sanity with a particular opcode"""
-
-        def check_ops_count(desired, found):
-            # Makes sure we have right operand count
-            if found < desired:
-                print(f"Line {line_num}: missing operand to {opcode}",
-                      file=sys.stderr)
-                sys.exit(1)
-            elif found > desired:
-                print(f"Line {line_num}: unexpected operand to {opcode}",
-                      file=sys.stderr)
-                sys.exit(1)
-
-        # Make sure we know this opcode at all
-        if opcode not in OPCODES:
-            print(f"line {line_num}: unknown opcode {opcode}", file=sys.stderr)
-            sys.exit(2)
-
-        op_type = OPCODES[opcode]["type"]
-
-        total_operands = 0
-
-        if op_a is not None:
-            total_operands += 1
-
-        if op_b is not None:
-            total_operands += 1
-
-        if op_type == 0 or op_type == 1 or op_type == 2:
-            # 0, 1, or 2 register operands
-            check_ops_count(op_type, total_operands)
-
-        elif op_type == 8:
-            # LDI r,i or LDI r,label
-            check_ops_count(2, total_operands)
-
-    # Type to function mapping
-    type_f = {
-        0: out0,
-        1: out1,
-        2: out2,
-        8: out8,
-    }
+    line_num = 0
 
-    for line in inputfile:
+    for line in lines:
         line_num += 1
 
         # Strip comments
@@ -325,78 +177,174 @@ def pass1(inputfile, sym, code):
         line = line.strip()
 
         # Ignore blank lines
-        if input == '':
+        if line == '':
             continue
 
-        # print(line)  # debug
+        label, opcode, op_a, op_b = match_line(line.upper()).groups()
 
-        m = re.match(REGEX, line)
+        # Track label address
+        if label is not None:
+            sym[label] = len(code)
+            labels.append((len(code), label))
 
-        if m is not None:
-            label, opcode, op_a, op_b = normalize_line(m.groups())
+        if opcode is None:
+            continue
 
-            # print(label, opcode, op_a, op_b)  # debug
+        if opcode == 'DS':
+            m = REGEX_DS.match(line)
+            if m is None or m.group(2) is None:
+                raise AsmError(f"line {line_num}: missing argument to DS", 2)
+            for char in m.group(2):
+                notes[len(code)] = '[space]' if char == ' ' else char
+                code.append(ord(char) & 0xff)
+            continue
 
-            # Track label address
-            if label is not None:
-                sym[label] = addr
-                # print(f"Label {label}: {addr}")  # debug
-                code.append(f'# {label} (address {addr}):')
+        if opcode == 'DB':
+            m = REGEX_DB.match(line)
+            if m is None or m.group(2) is None:
+                raise AsmError(f"line {line_num}: missing argument to DB", 2)
+            data = m.group(2)
+            try:
+                val = int(data, 0)
+            except ValueError:
+                raise AsmError(f"line {line_num}: invalid integer argument "
+                               f"to DB", 2)
+            notes[len(code)] = data
+            # Force to byte size
+            code.append(val & 0xff)
+            continue
 
-            if opcode is not None:
-                if opcode == 'DS':
-                    handle_ds(line)
-                elif opcode == 'DB':
-                    handle_db(line)
-                else:
-                    # Check operand count
-                    check_ops(opcode, op_a, op_b)
+        # Make sure we know this opcode at all
+        encoding = encodings.get(opcode)
+        if encoding is None:
+            raise AsmError(f"line {line_num}: unknown opcode {opcode}", 2)
+        op_type, machine_code = encoding
+
+        # Makes sure we have right operand count
+        total_operands = (op_a is not None) + (op_b is not None)
+        desired = 2 if op_type == 8 else op_type
+        if total_operands < desired:
+            raise AsmError(f"Line {line_num}: missing operand to {opcode}", 1)
+        elif total_operands > desired:
+            raise AsmError(f"Line {line_num}: unexpected operand to "
+                           f"{opcode}", 1)
+
+        notes[len(code)] = (opcode, op_a, op_b)
+
+        if op_type == 0:
+            code.append(machine_code)
+
+        elif op_type == 1:
+            code.append(machine_code)
+            code.append(get_reg(op_a, line_num))
+
+        elif op_type == 2:
+            code.append(machine_code)
+            code.append(get_reg(op_a, line_num))
+            code.append(get_reg(op_b, line_num))
 
-                    # Handle opcodes
-                    op_info = OPCODES[opcode]
-                    handler = type_f[op_info["type"]]
-                    handler(opcode, op_a, op_b, op_info["code"])
         else:
-            print(f"No match: {input}", file=sys.stderr)
-            sys.exit(3)
+            # LDI r,i or LDI r,label
+            code.append(machine_code)
+            code.append(get_reg(op_a, line_num))
+            try:
+                code.append(int(op_b, 0) & 0xff)
+            except ValueError:
+                # If it's not a value, it might be a symbol
+                fixups.append((len(code), op_b, line_num))
+                code.append(0)
+
+    # Backpatch the label operands
+    for address, name, line_num in fixups:
+        if name not in sym:
+            raise AsmError(f"unknown symbol: {name}", 2)
+        code[address] = sym[name] & 0xff
+
+    return program
 
 
-def pass2(outputfile, sym, code):
+def assemble(source):
     """
-    Output the code, substituting in any symbols.
+    Assemble source, a string or an iterable of lines, in memory and return
+    an Image of the code and symbol table, ready for CPU.load_image().
+    Raises AsmError for the first error in the source, or if the code does
+    not fit in RAM.
     """
 
-    for c in code:
-        # Replace symbols
-        if c[:4] == 'sym:':
-            s = c[4:].strip()
+    if isinstance(source, str):
+        source = source.splitlines()
 
-            if s in sym:
-                c = p8(sym[s])
+    program = assemble_lines(source)
+    if len(program.code) > 256:
+        raise AsmError(f"program is {len(program.code)} bytes, RAM is 256", 2)
+    return Image(program.code, program.sym)
 
+
+def write_text(outputfile, program):
+    """
+    Output the code as text: one byte per line in base 2, annotated with
+    the source it came from and a comment line for each label.
+    """
+
+    code = program.code
+    notes = program.notes
+    labels = program.labels
+    lines = []
+    next_label = 0
+
+    for address in range(len(code) + 1):
+        while (next_label < len(labels) and
+               labels[next_label][0] == address):
+            lines.append(f"# {labels[next_label][1]} (address {address}):")
+            next_label += 1
+
+        if address == len(code):
+            break
+
+        note = notes.get(address)
+        if note is None:
+            lines.append(p8(code[address]))
+        elif isinstance(note, str):
+            lines.append(f"{p8(code[address])} # {note}")
+        else:
+            opcode, op_a, op_b = note
+            if op_b is not None:
+                note = f"{opcode} {op_a},{op_b}"
+            elif op_a is not None:
+                note = f"{opcode} {op_a}"
             else:
-                print(f"unknown symbol: {s}", file=sys.stderr)
-                sys.exit(2)
+                note = opcode
+            lines.append(f"{p8(code[address])} # {note}")
+
+    lines.append("")
+    outputfile.write("\n".join(lines))
 
-        outputfile.write(f"{c}\n")
+
+def write_binary(outputfile, program):
+    """Output the code as an .ls8b image with the symbol table."""
+
+    write_image(outputfile, program.code, program.sym)
 
 
 def main(argv):
     # Parse command line
     inputfile, outputfile = parse_commandline(argv)
+    binary = outputfile.endswith(".ls8b")
 
     # Open files
-    inputfile, outputfile = open_files(inputfile, outputfile)
-
-    # Set up the symbol table
-    sym = {}
-
-    # Set up the machine code output
-    code = []
+    inputfile, outputfile = open_files(inputfile, outputfile, binary)
 
     # Assemble
-    pass1(inputfile, sym, code)
-    pass2(outputfile, sym, code)
+    try:
+        program = assemble_lines(inputfile)
+    except AsmError as e:
+        print(e, file=sys.stderr)
+        return e.status
+
+    if binary:
+        write_binary(outputfile, program)
+    else:
+        write_text(outputfile, program)
 
     return 0
 
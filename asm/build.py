@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+Build driver: assembles many sources at once, skipping the ones whose
+output is up to date.
+
+Usage: build.py [options] [source.asm ...]
+
+With no sources, builds every *.asm next to this script into
+../ls8/examples, as buildall always has.
+
+Outputs are cached by content: the key of a source is the hash of its text,
+the output format, the assembler version and the instruction set, and the
+cache keeps one output per key. A source whose key is cached is copied out
+of the cache rather than assembled; the rest are assembled across a
+process pool. A manifest of source and output stat results lets a rebuild
+with nothing changed skip even reading the sources. Every file is written
+to a temporary name and renamed into place, so an interrupted build never
+leaves half an output.
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import asm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Where buildall has always put its output
+DEFAULT_OUTPUT = os.path.join(HERE, "..", "ls8", "examples")
+
+# Default cache directory
+DEFAULT_CACHE = os.path.join(HERE, ".buildcache")
+
+
+def key_prefix():
+    """Everything besides the source that decides the output."""
+    return (f"asm {asm.ASSEMBLER_VERSION}\n"
+            f"{asm.INSTRUCTIONS!r}\n").encode("utf-8")
+
+
+def source_key(prefix, text, binary):
+    """Cache key of a source's text, for text or .ls8b output."""
+    digest = hashlib.sha256(prefix)
+    digest.update(b"ls8b\n" if binary else b"ls8\n")
+    digest.update(text)
+    return digest.hexdigest()
+
+
+def write_atomic(path, data):
+    """Write data to path through a temporary file and a rename."""
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def assemble_source(path, binary):
+    """
+    Assemble one source file. Returns (output bytes, None), or (None, the
+    error message).
+    """
+    try:
+        with open(path) as f:
+            program = asm.assemble_lines(f)
+        if binary:
+            out = io.BytesIO()
+            asm.write_binary(out, program)
+            return out.getvalue(), None
+        out = io.StringIO()
+        asm.write_text(out, program)
+        return out.getvalue().encode("utf-8"), None
+    except (asm.AsmError, OSError, ValueError) as e:
+        return None, f"{path}: {e}"
+
+
+class Cache:
+    """
+    The content-addressed store of outputs, objects/<key>, and the
+    manifest of what each output was last built from. The manifest is
+    stamped with a hash of key_prefix(), and a manifest written by another
+    assembler version or instruction set is thrown away, so its entries
+    cannot vouch for outputs the current assembler would not produce.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects = os.path.join(directory, "objects")
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.prefix = key_prefix()
+        self.version = hashlib.sha256(self.prefix).hexdigest()
+        try:
+            with open(self.manifest_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        if saved.get("version") == self.version:
+            self.manifest = saved["entries"]
+            self.changed = False
+        else:
+            self.manifest = {}
+            self.changed = bool(saved)
+
+    def object_path(self, key):
+        return os.path.join(self.objects, key)
+
+    def get(self, key):
+        """The cached output for key, or None."""
+        try:
+            with open(self.object_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        os.makedirs(self.objects, exist_ok=True)
+        write_atomic(self.object_path(key), data)
+
+    def up_to_date(self, source, output, st):
+        """
+        True if the manifest says output was built from source as it is
+        now, and output has not changed since. Looks only at stat results.
+        """
+        entry = self.manifest.get(source)
+        if entry is None or entry["source"] != [st.st_mtime_ns, st.st_size]:
+            return False
+        if entry["output"] != output:
+            return False
+        try:
+            out = os.stat(output)
+        except FileNotFoundError:
+            return False
+        return entry["output_stat"] == [out.st_mtime_ns, out.st_size]
+
+    def record(self, source, output, st, key):
+        out = os.stat(output)
+        self.manifest[source] = {
+            "source": [st.st_mtime_ns, st.st_size],
+            "key": key,
+            "output": output,
+            "output_stat": [out.st_mtime_ns, out.st_size],
+        }
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        saved = {"version": self.version, "entries": self.manifest}
+        write_atomic(self.manifest_path,
+                     json.dumps(saved, indent=1).encode("utf-8"))
+
+
+def build(sources, output_dir, cache, binary=False, workers=None):
+    """
+    Bring the output of every source up to date. Returns (assembled,
+    copied from the cache, up to date, errors); errors is a list of
+    messages.
+    """
+    extension = ".ls8b" if binary else ".ls8"
+    stale = []
+    copied = fresh = 0
+    errors = []
+
+    for source in sources:
+        source = os.path.abspath(source)
+        name = os.path.splitext(os.path.basename(source))[0]
+        output = os.path.abspath(os.path.join(output_dir, name + extension))
+        try:
+            st = os.stat(source)
+        except OSError as e:
+            errors.append(f"{source}: {e}")
+            continue
+        if cache.up_to_date(source, output, st):
+            fresh += 1
+            continue
+
+        with open(source, "rb") as f:
+            key = source_key(cache.prefix, f.read(), binary)
+        data = cache.get(key)
+        if data is None:
+            stale.append((source, output, st, key))
+            continue
+        write_atomic(output, data)
+        cache.record(source, output, st, key)
+        copied += 1
+
+    if len(stale) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(assemble_source,
+                                    [s[0] for s in stale],
+                                    [binary] * len(stale)))
+    else:
+        results = [assemble_source(s[0], binary) for s in stale]
+
+    assembled = 0
+    for (source, output, st, key), (data, error) in zip(stale, results):
+        if error is not None:
+            errors.append(error)
+            continue
+        cache.put(key, data)
+        write_atomic(output, data)
+        cache.record(source, output, st, key)
+        assembled += 1
+
+    cache.save()
+    return assembled, copied, fresh, errors
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Assemble LS-8 sources, skipping up-to-date outputs.")
+    parser.add_argument("sources", nargs="*", metavar="source.asm",
+                        help="default: every *.asm beside build.py")
+    parser.add_argument("-o", "--output", metavar="DIR",
+                        default=DEFAULT_OUTPUT,
+                        help="where outputs go (default: ../ls8/examples)")
+    parser.add_argument("--cache", metavar="DIR", default=DEFAULT_CACHE,
+                        help="cache directory (default: .buildcache)")
+    parser.add_argument("--binary", action="store_true",
+                        help="write .ls8b images instead of text .ls8")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args(argv[1:])
+
+    sources = args.sources or sorted(glob.glob(os.path.join(HERE, "*.asm")))
+    os.makedirs(args.output, exist_ok=True)
+
+    assembled, copied, fresh, errors = build(sources, args.output,
+                                             Cache(args.cache), args.binary,
+                                             args.workers)
+
+    for error in errors:
+        print(error, file=sys.stderr)
+    if not args.quiet:
+        print(f"{assembled} assembled, {copied} from cache, "
+              f"{fresh} up to date, {len(errors)} failed")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
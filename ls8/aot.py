@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+"""
+Ahead-of-time translator: turns a program image into a Python module with
+one function per basic block, cached on disk by the image's hash.
+
+Usage: aot.py [--cache DIR] [--force] program...
+
+The control-flow graph is built from address 0: fall-through edges, CALL
+return addresses, and JMP/CALL/conditional jump targets wherever the
+register holds a constant loaded by LDI earlier in the block. Interrupt
+vectors in the image, or stored by the program with constant operands, are
+roots too. The module's BLOCKS table is the jump table for indirect
+targets; a target with no block in it, such as a return from an interrupt,
+runs on the decode cache until it reaches one.
+
+ls8.py uses a cached translation whenever one exists for the program.
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import os
+import sys
+
+from compiler import TERMINATORS, block_size, emit_block, scan_block
+from cpu import *
+
+# Bumped whenever the generated code changes, so old translations miss
+TRANSLATOR_VERSION = 3
+
+# Default translation cache, unless LS8_CACHE says otherwise
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "ls8")
+
+HEADER = '''"""
+Translation of an LS-8 image, generated by aot.py. Do not edit: it is
+regenerated whenever the image or the translator changes.
+"""
+
+from cpu import Halt, Pending
+
+IMAGE_HASH = {image_hash!r}
+'''
+
+
+def image_hash(ram):
+    """Hash of 256 bytes of RAM and the translator version."""
+    digest = hashlib.sha256(bytes(ram))
+    digest.update(f"aot {TRANSLATOR_VERSION}".encode("ascii"))
+    return digest.hexdigest()
+
+
+def cache_dir():
+    return os.environ.get("LS8_CACHE", DEFAULT_CACHE)
+
+
+def cache_path(ram, directory=None):
+    """Where the translation of ram lives in the cache."""
+    if directory is None:
+        directory = cache_dir()
+    return os.path.join(directory, f"ls8_{image_hash(ram)[:24]}.py")
+
+
+def successors(cpu, instructions, roots, unresolved):
+    """
+    Return the addresses control can go to after a scanned block, tracking
+    registers loaded by LDI to resolve jump targets. Vectors the block
+    stores with constant operands are added to roots, and a final jump
+    whose target is not a constant to unresolved.
+    """
+    known = {}
+    targets = []
+
+    for pc, opcode, a, b, next_pc in instructions:
+        if opcode == LDI:
+            known[a] = b
+        elif opcode == ST:
+            if a in known and b in known and known[a] >= INTERRUPT_VECTORS:
+                roots.append(known[b])
+        elif opcode in REGISTER_WRITERS:
+            known.pop(a, None)
+        elif opcode not in (PRN, PRA, PUSH, CMP, CALL, JMP) and \
+                opcode not in CONDITIONAL_JUMPS:
+            # anything else may change any register
+            known.clear()
+
+    pc, opcode, a, b, next_pc = instructions[-1]
+    if opcode in (JMP, CALL) or opcode in CONDITIONAL_JUMPS:
+        if a in known:
+            targets.append(known[a])
+        else:
+            unresolved.add(pc)
+    if cpu.branchtable[opcode] == cpu.handle_trap:
+        return targets
+    if opcode not in TERMINATORS or opcode == CALL or \
+            opcode in CONDITIONAL_JUMPS:
+        targets.append(next_pc)
+
+    return targets
+
+
+def find_blocks(cpu):
+    """
+    Scan the code reachable from address 0 in cpu.ram. Returns
+    {start: instructions} and the sorted list of jump sites whose target
+    could not be resolved.
+    """
+    ram = cpu.ram
+    roots = [0]
+    roots += [ram[v] for v in range(INTERRUPT_VECTORS, 256) if ram[v]]
+    blocks = {}
+    unresolved = set()
+
+    while roots:
+        start = roots.pop()
+        if start in blocks:
+            continue
+        instructions = scan_block(ram, start, cpu.branchtable,
+                                  cpu.handle_trap)
+        blocks[start] = instructions
+        roots += successors(cpu, instructions, roots, unresolved)
+
+    return blocks, sorted(unresolved)
+
+
+def translate(ram):
+    """Return the source of the module translating 256 bytes of RAM."""
+    cpu = CPU()
+    cpu.ram[:] = ram
+    blocks, unresolved = find_blocks(cpu)
+
+    out = [HEADER.format(image_hash=image_hash(ram))]
+    table = []
+    for start in sorted(blocks):
+        instructions = blocks[start]
+        factory = f"make_{start:02X}"
+        out.append("")
+        out.append(emit_block(cpu, instructions).source(factory))
+        out.append("")
+        table.append(f"    0x{start:02X}: ({factory}, {len(instructions)}, "
+                     f"{block_size(instructions)}),")
+
+    out.append("")
+    out.append("# block start -> (factory, instructions, bytes covered)")
+    out.append("BLOCKS = {")
+    out += table
+    out.append("}")
+    out.append("")
+    out.append("# jumps whose target is only known at run time")
+    out.append("UNRESOLVED = [" +
+               ", ".join(f"0x{pc:02X}" for pc in unresolved) + "]")
+    return "\n".join(out) + "\n"
+
+
+def write_translation(ram, directory=None):
+    """Translate ram into the cache and return the module's path."""
+    path = cache_path(ram, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as f:
+        f.write(translate(ram))
+    # readers never see a half-written module
+    os.replace(temp, path)
+    return path
+
+
+def load_translation(ram, directory=None):
+    """
+    Import the cached translation of ram, or return None if there is none
+    or it does not match.
+    """
+    path = cache_path(ram, directory)
+    if not os.path.exists(path):
+        return None
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except (OSError, SyntaxError, ImportError):
+        return None
+    if getattr(module, "IMAGE_HASH", None) != image_hash(ram):
+        return None
+    return module
+
+
+def install(cpu, module):
+    """
+    Load a translation's blocks into cpu, which then runs on the compiled
+    engine's loop. Writes to translated code drop the blocks they hit, like
+    compiled ones. Call after loading the program: load() and reset() drop
+    the translation.
+    """
+    if module.IMAGE_HASH != image_hash(cpu.ram):
+        raise ValueError("translation is for a different image")
+    cpu.flush()
+    for start, (factory, length, size) in module.BLOCKS.items():
+        block = factory(cpu, cpu.reg, cpu.ram, cpu.write, cpu.blocks,
+                        cpu.branchtable)
+        block.length = length
+        block.size = size
+        cpu.add_block(start, block)
+    cpu.translated = True
+    cpu.engine = COMPILED
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Translate LS-8 programs to cached Python modules.")
+    parser.add_argument("programs", nargs="+", metavar="program")
+    parser.add_argument("--cache", metavar="DIR", default=None,
+                        help=f"translation cache (default: $LS8_CACHE or "
+                             f"{DEFAULT_CACHE})")
+    parser.add_argument("--force", action="store_true",
+                        help="translate even if a translation is cached")
+    args = parser.parse_args(argv[1:])
+
+    for program in args.programs:
+        cpu = CPU()
+        try:
+            cpu.load(program)
+        except (OSError, ValueError) as e:
+            print(f"{program}: {e}", file=sys.stderr)
+            return 2
+        path = cache_path(cpu.ram, args.cache)
+        if args.force or load_translation(cpu.ram, args.cache) is None:
+            path = write_translation(cpu.ram, args.cache)
+        module = load_translation(cpu.ram, args.cache)
+        print(f"{program}: {len(module.BLOCKS)} blocks, "
+              f"{len(module.UNRESOLVED)} unresolved -> {path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,390 @@
+"""
+Lockstep engine: runs many LS-8 machines as one vectorized NumPy batch.
+
+Each machine behaves as a CPU with no devices attached would, instruction
+for instruction: the same results, output, faults and traps, and INT, IRET
+and interrupt delivery as cpu.py does them.
+"""
+
+import numpy as np
+
+from cpu import *
+
+# Why each machine stopped, as an index into REASONS; the reasons are the
+# cpu.py ones, and a machine still running when max_steps ran out ends
+# with BUDGET like a CPU
+REASONS = (BUDGET, HALTED, TRAPPED, FAULTED)
+CODES = {reason: code for code, reason in enumerate(REASONS)}
+RUNNING = CODES[BUDGET]
+
+# IM & IS -> number of the interrupt to take first, as in cpu.py
+LOWEST_BIT = np.array(LOWEST_SET_BIT, dtype=np.uint8)
+
+
+class Batch:
+    """
+    State of N machines. Each machine is one row of ram/reg and one entry of
+    pc/fl/enabled/status/steps; output holds the text each machine printed.
+    """
+
+    def __init__(self, images):
+        n = len(images)
+        self.ram = np.zeros((n, 256), dtype=np.uint8)
+        for i, image in enumerate(images):
+            image = np.frombuffer(bytes(image), dtype=np.uint8)
+            self.ram[i, :len(image)] = image
+
+        # power-on register file, same as a fresh CPU()
+        self.reg = np.tile(np.frombuffer(CPU().reg.tobytes(), dtype=np.uint8),
+                           (n, 1))
+        self.pc = np.zeros(n, dtype=np.uint8)
+        self.fl = np.zeros(n, dtype=np.uint8)
+        # cleared while an interrupt handler runs, set again by IRET
+        self.enabled = np.ones(n, dtype=bool)
+        self.status = np.full(n, RUNNING, dtype=np.uint8)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.output = [[] for _ in range(n)]
+
+    def reason(self, i):
+        """Why machine i stopped, as a cpu.py reason."""
+        return REASONS[self.status[i]]
+
+    def operands(self, sel):
+        """Operand bytes a and b of the current instruction of each machine."""
+        pc = self.pc[sel].astype(np.intp)
+        a = self.ram[sel, (pc + 1) & 0xFF]
+        b = self.ram[sel, (pc + 2) & 0xFF]
+        return a, b
+
+    def advance(self, sel, size):
+        self.pc[sel] += np.uint8(size)
+
+    def push(self, sel, values):
+        sp = self.reg[sel, SP] - np.uint8(1)
+        self.reg[sel, SP] = sp
+        self.ram[sel, sp] = values
+
+    def pop(self, sel):
+        sp = self.reg[sel, SP]
+        values = self.ram[sel, sp]
+        self.reg[sel, SP] = sp + np.uint8(1)
+        return values
+
+    def fault(self, sel):
+        """Stop machines on an instruction that faulted: it does not retire."""
+        self.status[sel] = CODES[FAULTED]
+        self.steps[sel] -= 1
+
+    def interrupt(self, sel):
+        """
+        Enter the lowest pending interrupt on every machine in sel that has
+        one, as CPU.interrupt() does.
+        """
+        im_is = self.reg[sel, IM] & self.reg[sel, IS]
+        sel = sel[self.enabled[sel] & (im_is != 0)]
+        if len(sel) == 0:
+            return
+        n = LOWEST_BIT[self.reg[sel, IM] & self.reg[sel, IS]]
+
+        self.enabled[sel] = False
+        self.reg[sel, IS] &= ~(np.uint8(1) << n)
+        self.push(sel, self.pc[sel])
+        self.push(sel, self.fl[sel])
+        for r in range(7):
+            self.push(sel, self.reg[sel, r])
+        self.pc[sel] = self.ram[sel, INTERRUPT_VECTORS + n.astype(np.intp)]
+
+
+# Vector handlers, one per opcode. Each takes the batch and the row indices
+# of the machines currently sitting on that opcode.
+
+def op_nop(m, sel):
+    m.advance(sel, 1)
+
+
+def op_hlt(m, sel):
+    m.status[sel] = CODES[HALTED]
+    m.advance(sel, 1)
+
+
+def op_ldi(m, sel):
+    a, b = m.operands(sel)
+    m.reg[sel, a] = b
+    m.advance(sel, 3)
+
+
+def op_ld(m, sel):
+    a, b = m.operands(sel)
+    m.reg[sel, a] = m.ram[sel, m.reg[sel, b]]
+    m.advance(sel, 3)
+
+
+def op_prn(m, sel):
+    a, b = m.operands(sel)
+    for i, value in zip(sel.tolist(), m.reg[sel, a].tolist()):
+        m.output[i].append(f"{value}\n")
+    m.advance(sel, 2)
+
+
+def op_pra(m, sel):
+    a, b = m.operands(sel)
+    for i, value in zip(sel.tolist(), m.reg[sel, a].tolist()):
+        m.output[i].append(chr(value))
+    m.advance(sel, 2)
+
+
+def op_cmp(m, sel):
+    a, b = m.operands(sel)
+    va = m.reg[sel, a]
+    vb = m.reg[sel, b]
+    m.fl[sel] = np.where(va == vb, np.uint8(FL_EQUAL),
+                         np.where(va < vb, np.uint8(FL_LESS),
+                                  np.uint8(FL_GREATER)))
+    m.advance(sel, 3)
+
+
+def alu(function):
+    """Handler for a two-register ALU instruction storing function(a, b)."""
+    def op_alu(m, sel):
+        a, b = m.operands(sel)
+        m.reg[sel, a] = function(m.reg[sel, a], m.reg[sel, b])
+        m.advance(sel, 3)
+    return op_alu
+
+
+def alu_divide(function):
+    """alu() for DIV and MOD, which fault on a zero divisor."""
+    def op_divide(m, sel):
+        a, b = m.operands(sel)
+        zero = m.reg[sel, b] == 0
+        m.fault(sel[zero])
+        sel, a, b = sel[~zero], a[~zero], b[~zero]
+        m.reg[sel, a] = function(m.reg[sel, a], m.reg[sel, b])
+        m.advance(sel, 3)
+    return op_divide
+
+
+def alu_unary(function):
+    """Handler for a one-register ALU instruction storing function(a)."""
+    def op_unary(m, sel):
+        a, b = m.operands(sel)
+        m.reg[sel, a] = function(m.reg[sel, a])
+        m.advance(sel, 2)
+    return op_unary
+
+
+def shift_left(x, n):
+    # shifts of 8 or more clear the register, like (x << n) & 0xFF
+    wide = x.astype(np.uint16) << np.minimum(n, 8).astype(np.uint16)
+    return (wide & 0xFF).astype(np.uint8)
+
+
+def shift_right(x, n):
+    return np.where(n < 8, x >> np.minimum(n, 7), np.uint8(0))
+
+
+def op_st(m, sel):
+    a, b = m.operands(sel)
+    m.ram[sel, m.reg[sel, a]] = m.reg[sel, b]
+    m.advance(sel, 3)
+
+
+def op_push(m, sel):
+    # decrement SP first: PUSH R7 pushes the new SP
+    a, b = m.operands(sel)
+    m.reg[sel, SP] -= np.uint8(1)
+    m.ram[sel, m.reg[sel, SP]] = m.reg[sel, a]
+    m.advance(sel, 2)
+
+
+def op_pop(m, sel):
+    # increment SP last: POP R7 leaves the popped value plus one
+    a, b = m.operands(sel)
+    m.reg[sel, a] = m.ram[sel, m.reg[sel, SP]]
+    m.reg[sel, SP] += np.uint8(1)
+    m.advance(sel, 2)
+
+
+def op_call(m, sel):
+    a, b = m.operands(sel)
+    m.push(sel, m.pc[sel] + np.uint8(2))
+    m.pc[sel] = m.reg[sel, a]
+
+
+def op_ret(m, sel):
+    m.pc[sel] = m.pop(sel)
+
+
+def op_jmp(m, sel):
+    a, b = m.operands(sel)
+    m.pc[sel] = m.reg[sel, a]
+
+
+def op_conditional(m, sel, opcode):
+    # the register is only read when the jump is taken, so only then can
+    # it fault
+    bits, when_set = CONDITIONAL_JUMPS[opcode]
+    taken = ((m.fl[sel] & bits) != 0) == when_set
+    a, b = m.operands(sel)
+    bad = taken & (a > 7)
+    m.fault(sel[bad])
+    sel, a, taken = sel[~bad], a[~bad], taken[~bad]
+    m.pc[sel] = np.where(taken, m.reg[sel, np.minimum(a, 7)],
+                         m.pc[sel] + np.uint8(2))
+
+
+def op_jeq(m, sel):
+    op_conditional(m, sel, JEQ)
+
+
+def op_jne(m, sel):
+    op_conditional(m, sel, JNE)
+
+
+def op_jgt(m, sel):
+    op_conditional(m, sel, JGT)
+
+
+def op_jlt(m, sel):
+    op_conditional(m, sel, JLT)
+
+
+def op_jle(m, sel):
+    op_conditional(m, sel, JLE)
+
+
+def op_jge(m, sel):
+    op_conditional(m, sel, JGE)
+
+
+def op_int(m, sel):
+    # raise the interrupt numbered in register a; it is delivered at the
+    # end of the step
+    a, b = m.operands(sel)
+    m.reg[sel, IS] |= np.uint8(1) << (m.reg[sel, a] & 7)
+    m.advance(sel, 2)
+
+
+def op_iret(m, sel):
+    for r in range(6, -1, -1):
+        m.reg[sel, r] = m.pop(sel)
+    m.fl[sel] = m.pop(sel)
+    m.pc[sel] = m.pop(sel)
+    m.enabled[sel] = True
+
+
+def op_trap(m, sel):
+    # the undefined opcode does not retire
+    m.status[sel] = CODES[TRAPPED]
+    m.steps[sel] -= 1
+
+
+HANDLERS = {
+    NOP: op_nop,
+    HLT: op_hlt,
+    RET: op_ret,
+    IRET: op_iret,
+    PRN: op_prn,
+    PRA: op_pra,
+    PUSH: op_push,
+    POP: op_pop,
+    CALL: op_call,
+    INT: op_int,
+    JMP: op_jmp,
+    JEQ: op_jeq,
+    JNE: op_jne,
+    JGT: op_jgt,
+    JLT: op_jlt,
+    JLE: op_jle,
+    JGE: op_jge,
+    INC: alu_unary(lambda x: x + np.uint8(1)),
+    DEC: alu_unary(lambda x: x - np.uint8(1)),
+    NOT: alu_unary(np.invert),
+    LDI: op_ldi,
+    LD: op_ld,
+    ST: op_st,
+    ADD: alu(np.add),
+    SUB: alu(np.subtract),
+    MUL: alu(np.multiply),
+    DIV: alu_divide(np.floor_divide),
+    MOD: alu_divide(np.remainder),
+    CMP: op_cmp,
+    AND: alu(np.bitwise_and),
+    OR: alu(np.bitwise_or),
+    XOR: alu(np.bitwise_xor),
+    SHL: alu(shift_left),
+    SHR: alu(shift_right),
+}
+
+for _name, _code, _form in INSTRUCTIONS:
+    # a batch runs everything a CPU does
+    assert _code in HANDLERS or _name in UNIMPLEMENTED, _name
+
+
+def check_registers(m, sel, opcode):
+    """
+    Fault the machines whose register operands are out of range (where
+    CPU would raise IndexError) and return the rest. Conditional jumps
+    check their own, since only a taken jump reads its register.
+    """
+    # "ri" forms name one register, the other operand is an immediate
+    count = FORMS[opcode].count("r")
+    if count == 0 or opcode in CONDITIONAL_JUMPS:
+        return sel
+
+    a, b = m.operands(sel)
+    bad = a > 7
+    if count == 2:
+        bad |= b > 7
+    if bad.any():
+        # PUSH and CALL move SP, and CALL pushes, before reading the
+        # register that faults
+        if opcode == PUSH:
+            m.reg[sel[bad], SP] -= np.uint8(1)
+        elif opcode == CALL:
+            m.push(sel[bad], m.pc[sel[bad]] + np.uint8(2))
+        m.fault(sel[bad])
+        sel = sel[~bad]
+    return sel
+
+
+def step(m, active):
+    """
+    Run one instruction on every active machine, grouping machines by their
+    current opcode so each handler runs once per distinct opcode, then
+    deliver any interrupt it left pending.
+    """
+    opcodes = m.ram[active, m.pc[active]]
+    m.steps[active] += 1
+
+    for opcode in np.unique(opcodes).tolist():
+        sel = active[opcodes == opcode]
+        handler = HANDLERS.get(opcode, op_trap)
+        if handler is not op_trap:
+            sel = check_registers(m, sel, opcode)
+        handler(m, sel)
+
+    # CPU delivers an interrupt right after the instruction that made it
+    # pending, before the budget is checked
+    m.interrupt(active[m.status[active] == RUNNING])
+
+
+def run_batch(images, max_steps):
+    """
+    Run every image in lockstep for up to max_steps instructions each.
+    Halted, trapped and faulted machines drop out of the active set.
+
+    Returns the final Batch; output[i] is joined into the string machine i
+    printed.
+    """
+    m = Batch(images)
+    active = np.arange(len(images))
+
+    for _ in range(max_steps):
+        if len(active) == 0:
+            break
+        step(m, active)
+        active = active[m.status[active] == RUNNING]
+
+    m.output = ["".join(out) for out in m.output]
+    return m
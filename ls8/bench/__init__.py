@@ -0,0 +1,23 @@
+"""
+Benchmark suite for the LS-8 emulator.
+
+Usage: python -m bench [options]   (from the ls8 directory)
+
+Runs every example program, every assembler source and the synthetic
+workloads in bench/programs on each engine, and reports instructions/sec,
+wall time, dispatches saved by fused instruction pairs, cold-start time and
+peak memory. Results can be saved as JSON and compared against a stored
+baseline.
+
+python -m bench.assembler times the assembler on large generated sources.
+"""
+
+import os
+import sys
+
+# the emulator modules sit next to this package, the assembler beside it
+LS8_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASM_DIR = os.path.join(os.path.dirname(LS8_DIR), "asm")
+
+if LS8_DIR not in sys.path:
+    sys.path.insert(0, LS8_DIR)
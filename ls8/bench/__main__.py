@@ -0,0 +1,126 @@
+"""Command line entry point: python -m bench."""
+
+import argparse
+import json
+import platform
+import sys
+
+from cpu import ENGINES
+
+from .measure import (cold_start, count_instructions, dispatches_saved,
+                      peak_memory, time_run)
+from .workloads import all_workloads
+
+# Metrics compared against the baseline; True where bigger is better
+METRICS = {
+    "instr_per_sec": True,
+    "cold_start": False,
+    "peak_memory": False,
+}
+
+
+def run_suite(engines, min_time, match=None):
+    """Measure every workload on every engine. Returns the result records."""
+    results = []
+    for workload in all_workloads():
+        if match is not None and match not in workload.name:
+            continue
+        instructions = count_instructions(workload)
+        for engine in engines:
+            seconds = time_run(workload, engine, min_time)
+            results.append({
+                "workload": workload.name,
+                "engine": engine,
+                "instructions": instructions,
+                "seconds": seconds,
+                "instr_per_sec": instructions / seconds,
+                "dispatches_saved": dispatches_saved(workload, engine),
+                "cold_start": cold_start(workload, engine),
+                "peak_memory": peak_memory(workload, engine),
+            })
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Set "change" on each result to its change from the baseline per metric,
+    and return the (workload, engine, metric, change) regressions worse than
+    tolerance.
+    """
+    before = {(r["workload"], r["engine"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = before.get((r["workload"], r["engine"]))
+        if old is None:
+            continue
+        r["change"] = {}
+        for metric, higher_is_better in METRICS.items():
+            if not old.get(metric):
+                continue
+            change = (r[metric] - old[metric]) / old[metric]
+            r["change"][metric] = change
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append((r["workload"], r["engine"], metric,
+                                    change))
+    return regressions
+
+
+def print_table(results):
+    print(f"{'workload':<22} {'engine':<12} {'instructions':>12} "
+          f"{'seconds':>10} {'instr/sec':>12} {'fused':>8} "
+          f"{'cold (ms)':>10} {'peak KiB':>9} {'vs base':>8}")
+    for r in results:
+        change = r.get("change", {}).get("instr_per_sec")
+        vs_base = "" if change is None else f"{change:+.1%}"
+        print(f"{r['workload']:<22} {r['engine']:<12} "
+              f"{r['instructions']:>12} {r['seconds']:>10.6f} "
+              f"{r['instr_per_sec']:>12.0f} {r['dispatches_saved']:>8} "
+              f"{r['cold_start'] * 1000:>10.3f} "
+              f"{r['peak_memory'] / 1024:>9.1f} {vs_base:>8}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench",
+                                     description="Benchmark the LS-8 engines.")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="write the results to FILE as JSON")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare against results saved in FILE; exit "
+                             "with status 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative slowdown that counts as a regression "
+                             "(default 0.10)")
+    parser.add_argument("--engine", action="append", choices=ENGINES,
+                        help="engine to run, repeatable (default: all)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="seconds to repeat each timed run for")
+    parser.add_argument("--match", metavar="TEXT",
+                        help="only workloads whose name contains TEXT")
+    args = parser.parse_args(argv[1:])
+
+    results = run_suite(args.engine or ENGINES, args.min_time, args.match)
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+
+    print_table(results)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(),
+                       "machine": platform.machine(),
+                       "results": results}, f, indent=2)
+            f.write("\n")
+
+    for workload, engine, metric, change in regressions:
+        print(f"REGRESSION {workload} {engine} {metric}: {change:+.1%}",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,91 @@
+"""
+Assembler throughput on generated sources: python -m bench.assembler
+
+Assembles synthetic programs of growing size in-process and reports lines
+per second at each size. Time per line should stay flat as the source
+grows: the assembler makes one pass over the lines and one over the label
+fixups.
+"""
+
+import argparse
+import sys
+import time
+
+from . import ASM_DIR
+
+if ASM_DIR not in sys.path:
+    sys.path.insert(0, ASM_DIR)
+
+import asm
+
+# Source lines per generated program
+SIZES = (10_000, 20_000, 40_000, 80_000)
+
+
+def generate_source(lines):
+    """
+    A source of about the given number of lines, in the style of the
+    examples: labelled blocks of arithmetic and stack operations, jumps and
+    calls through labels defined both before and after their use, strings,
+    data bytes and comments.
+    """
+    out = []
+    n = 0
+    while len(out) < lines:
+        out += [
+            f"Block{n}:",
+            f"    LDI R0,{n & 0xFF}   ; counter",
+            "    LDI R1,0x01",
+            "    ADD R0,R1",
+            "    MUL R0,R1",
+            "    CMP R0,R1",
+            f"    LDI R2,Block{n + 1}",
+            "    JNE R2",
+            f"    LDI R3,Block{n // 2}",
+            "    PUSH R0",
+            "    CALL R3",
+            "    POP R0",
+            "    PRN R0",
+            f"Text{n}: DS Hello, {n}",
+            "    DB 0x0a",
+            "",
+        ]
+        n += 1
+    out.append(f"Block{n}:")
+    out.append("    HLT")
+    return [line + "\n" for line in out]
+
+
+def time_assembly(source, min_time):
+    """Fastest time to assemble source, repeated for at least min_time."""
+    best = None
+    total = 0.0
+    while total < min_time:
+        start = time.perf_counter()
+        asm.assemble_lines(source)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m bench.assembler",
+                                     description="Benchmark the assembler.")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="seconds to repeat each size for")
+    args = parser.parse_args(argv[1:])
+
+    print(f"{'lines':>8} {'seconds':>10} {'lines/sec':>12} {'us/line':>8}")
+    for size in SIZES:
+        source = generate_source(size)
+        seconds = time_assembly(source, args.min_time)
+        print(f"{len(source):>8} {seconds:>10.4f} "
+              f"{len(source) / seconds:>12.0f} "
+              f"{seconds / len(source) * 1e6:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
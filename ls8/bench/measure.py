@@ -0,0 +1,77 @@
+"""Timing, cold-start and memory measurements of one workload."""
+
+import time
+import tracemalloc
+
+from cpu import *
+from sinks import NullSink
+
+from .workloads import load_program
+
+
+def fresh_cpu(workload, engine):
+    """A new CPU with the workload in RAM, ready to run."""
+    cpu = CPU(engine, output=NullSink())
+    if workload.path is not None:
+        cpu.load(workload.path)
+    else:
+        load_program(cpu, workload.program)
+    cpu.reg[IM] = workload.mask
+    return cpu
+
+
+def count_instructions(workload):
+    """Instructions retired by a full run, on the reference interpreter."""
+    return fresh_cpu(workload, INTERPRETER).run().instructions
+
+
+def dispatches_saved(workload, engine=CACHED):
+    """Dispatches a full run saved by executing fused instruction pairs."""
+    cpu = fresh_cpu(workload, engine)
+    cpu.run()
+    return cpu.dispatches_saved
+
+
+def time_run(workload, engine=CACHED, min_time=0.2):
+    """
+    Fastest wall time of fresh runs of the workload, repeated for at least
+    min_time. Each run includes decoding or compiling the program.
+    """
+    best = None
+    total = 0.0
+    while total < min_time:
+        cpu = fresh_cpu(workload, engine)
+        start = time.perf_counter()
+        cpu.run()
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def cold_start(workload, engine=CACHED, repeat=50):
+    """
+    Fastest time from nothing to the first retired instruction: build the
+    CPU, load the program and run one instruction.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cpu = fresh_cpu(workload, engine)
+        cpu.run(1)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peak_memory(workload, engine=CACHED):
+    """Peak bytes allocated by Python while building and running a CPU."""
+    tracemalloc.start()
+    try:
+        cpu = fresh_cpu(workload, engine)
+        cpu.run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
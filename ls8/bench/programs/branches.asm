@@ -0,0 +1,40 @@
+; branches.asm
+;
+; Branch-heavy: a phase counter cycling 0, 1, 2 drives a chain of compares,
+; so JEQ/JNE outcomes change from one iteration to the next. 250 x 60
+; iterations; the outer count lives in memory.
+
+    LDI R1,1
+    LDI R3,0             ; phase
+Outer:
+    LDI R0,0             ; inner count
+Inner:
+    ADD R3,R1            ; phase = (phase + 1) % 3
+    LDI R4,3
+    CMP R3,R4
+    LDI R2,Check
+    JNE R2
+    LDI R3,0
+Check:
+    CMP R3,R1            ; phase 1 skips the JMP
+    LDI R2,Next
+    JEQ R2
+    JMP R2
+Next:
+    ADD R0,R1
+    LDI R4,250
+    CMP R0,R4
+    LDI R2,Inner
+    JNE R2
+    LDI R2,Count         ; Count += 1
+    LD R4,R2
+    ADD R4,R1
+    ST R2,R4
+    LDI R0,60
+    CMP R4,R0
+    LDI R2,Outer
+    JNE R2
+    HLT
+
+Count:
+    DB 0
@@ -0,0 +1,29 @@
+; recursion.asm
+;
+; CALL/RET-heavy: Rec calls itself 100 levels deep, 250 times over.
+
+    LDI R1,1
+    LDI R2,Rec
+    LDI R0,0             ; outer count
+Outer:
+    LDI R3,Ret
+    LDI R4,100           ; depth
+    PUSH R0
+    LDI R0,0
+    CALL R2
+    POP R0
+    ADD R0,R1
+    LDI R4,250
+    CMP R0,R4
+    LDI R3,Outer
+    JNE R3
+    HLT
+
+; Recurse until R0 reaches R4
+Rec:
+    CMP R0,R4
+    JEQ R3
+    ADD R0,R1
+    CALL R2
+Ret:
+    RET
@@ -0,0 +1,28 @@
+; stack.asm
+;
+; Stack churn: push and pop four registers, 250 x 100 times.
+
+    LDI R1,1
+    LDI R3,0             ; outer count
+Outer:
+    LDI R0,0             ; inner count
+    LDI R4,250
+    LDI R2,Inner
+Inner:
+    PUSH R0
+    PUSH R1
+    PUSH R2
+    PUSH R3
+    POP R3
+    POP R2
+    POP R1
+    POP R0
+    ADD R0,R1
+    CMP R0,R4
+    JNE R2
+    ADD R3,R1
+    LDI R4,100
+    CMP R3,R4
+    LDI R2,Outer
+    JNE R2
+    HLT
@@ -0,0 +1,137 @@
+"""Programs the benchmark runs."""
+
+import glob
+import os
+import sys
+
+from cpu import *
+from sinks import NullSink
+
+from . import ASM_DIR, LS8_DIR
+
+EXAMPLES = os.path.join(LS8_DIR, "examples")
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "programs")
+
+# Nested counting loop: 250 * 250 iterations of ADD/CMP/JNE
+#
+#     LDI R1,1
+#     LDI R2,250
+#     LDI R4,0
+# Outer:
+#     LDI R0,0
+#     LDI R3,Inner
+# Inner:
+#     ADD R0,R1
+#     CMP R0,R2
+#     JNE R3
+#     ADD R4,R1
+#     CMP R4,R2
+#     LDI R3,Outer
+#     JNE R3
+#     HLT
+TIGHT_LOOP = [
+    LDI, 1, 1,
+    LDI, 2, 250,
+    LDI, 4, 0,
+    LDI, 0, 0,      # Outer (address 9)
+    LDI, 3, 15,
+    ADD, 0, 1,      # Inner (address 15)
+    CMP, 0, 2,
+    JNE, 3,
+    ADD, 4, 1,
+    CMP, 4, 2,
+    LDI, 3, 9,
+    JNE, 3,
+    HLT,
+]
+
+
+class Workload:
+    """
+    A program to benchmark: its bytes, the file it came from (None for
+    built-in programs) and the IM value it runs with.
+    """
+
+    def __init__(self, name, program, path=None, mask=0):
+        self.name = name
+        self.program = program
+        self.path = path
+        self.mask = mask
+
+
+def load_program(cpu, program):
+    """Copy a list of bytes into RAM starting at address 0."""
+    for address, byte in enumerate(program):
+        cpu.ram[address] = byte
+
+
+def read_example(filepath):
+    """Read an .ls8 file into a list of bytes."""
+    cpu = CPU()
+    cpu.load(filepath)
+    # trailing zero bytes are NOPs or empty RAM, drop them
+    program = list(cpu.ram)
+    while program and program[-1] == 0:
+        program.pop()
+    return program
+
+
+def assemble_file(filepath):
+    """Assemble an .asm file with asm/asm.py and return its bytes."""
+    if ASM_DIR not in sys.path:
+        sys.path.insert(0, ASM_DIR)
+    import asm
+
+    with open(filepath) as f:
+        return list(asm.assemble(f).code)
+
+
+def halts(program, limit=1000000):
+    """True if the program reaches HLT within the instruction limit."""
+    cpu = CPU(output=NullSink())
+    load_program(cpu, program)
+    return cpu.run(limit).reason == HALTED
+
+
+def example_workloads():
+    """Every examples/*.ls8 program."""
+    return [Workload(os.path.basename(path), read_example(path), path)
+            for path in sorted(glob.glob(os.path.join(EXAMPLES, "*.ls8")))]
+
+
+def asm_workloads():
+    """Every asm/*.asm source, assembled."""
+    return [Workload("asm/" + os.path.basename(path), assemble_file(path))
+            for path in sorted(glob.glob(os.path.join(ASM_DIR, "*.asm")))]
+
+
+def synthetic_workloads():
+    """
+    The built-in tight ALU loop, the same loop with every interrupt
+    enabled in IM but none raised, and the bench/programs sources.
+    """
+    workloads = [
+        Workload("tight_loop", TIGHT_LOOP),
+        Workload("tight_loop_im", TIGHT_LOOP, mask=0xFF),
+    ]
+    for path in sorted(glob.glob(os.path.join(PROGRAMS, "*.asm"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        workloads.append(Workload(name, assemble_file(path)))
+    return workloads
+
+
+def all_workloads():
+    """
+    Every workload that halts. The rest wait for interrupts forever or
+    fail, so have no run time to measure; they are reported on stderr.
+    """
+    workloads = []
+    for workload in (example_workloads() + asm_workloads() +
+                     synthetic_workloads()):
+        if halts(workload.program):
+            workloads.append(workload)
+        else:
+            print(f"skipping {workload.name}: does not halt",
+                  file=sys.stderr)
+    return workloads
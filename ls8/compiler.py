@@ -0,0 +1,318 @@
+"""Basic-block compiler: turns straight-line LS-8 code into Python closures."""
+
+from cpu import *
+
+# Instructions that end a basic block
+TERMINATORS = {CALL, RET, JMP, HLT} | set(CONDITIONAL_JUMPS)
+
+# Conditional jump -> the comparison of the CMP operands it takes
+COMPARISONS = {
+    JEQ: "==", JNE: "!=", JGT: ">", JLT: "<", JLE: "<=", JGE: ">=",
+}
+
+# ALU instruction -> the expression it stores in register a. DIV and MOD
+# are left to their handlers, which fault on a zero divisor.
+ALU_EXPRESSIONS = {
+    ADD: "(r{a} + r{b}) & 0xFF",
+    SUB: "(r{a} - r{b}) & 0xFF",
+    MUL: "(r{a} * r{b}) & 0xFF",
+    AND: "r{a} & r{b}",
+    OR:  "r{a} | r{b}",
+    XOR: "r{a} ^ r{b}",
+    SHL: "(r{a} << r{b}) & 0xFF",
+    SHR: "r{a} >> r{b}",
+    INC: "(r{a} + 1) & 0xFF",
+    DEC: "(r{a} - 1) & 0xFF",
+    NOT: "r{a} ^ 0xFF",
+}
+
+# Longest block we will build, in instructions
+MAX_BLOCK = 64
+
+
+def can_fault(opcode, a, b):
+    """
+    True if the instruction may fault: it names a register that does not
+    exist, or it is a DIV or MOD, which fault on a zero divisor.
+    """
+    form = FORMS.get(opcode, "")
+    if form[:1] == "r" and a > 7:
+        return True
+    if form == "rr" and b > 7:
+        return True
+    return opcode == DIV or opcode == MOD
+
+
+def scan_block(ram, start, branchtable, trap):
+    """
+    Walk forward from start and return the list of (address, opcode, a, b,
+    next_pc) making up the basic block. The block stops after a terminator,
+    before an undefined opcode, or when it would wrap past the end of RAM.
+    An instruction that can fault gets a block of its own, so a fault is
+    reported at its own pc with everything before it retired.
+    """
+    instructions = []
+    pc = start
+
+    while len(instructions) < MAX_BLOCK:
+        opcode = ram[pc]
+        a = ram[(pc + 1) & 0xFF]
+        b = ram[(pc + 2) & 0xFF]
+        alone = branchtable[opcode] == trap or can_fault(opcode, a, b)
+        if alone and instructions:
+            break
+        next_pc = pc + SIZES[opcode]
+        if next_pc > 256 and instructions:
+            break
+        instructions.append((pc, opcode, a, b, next_pc & 0xFF))
+        if opcode in TERMINATORS or alone:
+            break
+        pc = next_pc
+        if pc == 256:
+            break
+
+    return instructions
+
+
+class Emitter:
+    """Collects the source lines of one block function."""
+
+    def __init__(self, start):
+        self.start = start
+        self.lines = []
+        # registers read from self.reg on entry
+        self.loaded = set()
+        # registers that must be written back on exit
+        self.dirty = set()
+        # instructions after the one being emitted
+        self.remaining = 0
+        # True once a CMP in this block left its operands in c_a and c_b
+        self.compared = False
+
+    def use(self, *regs):
+        """Mark registers as read by the block."""
+        for r in regs:
+            if r not in self.dirty:
+                self.loaded.add(r)
+
+    def assign(self, r, expr):
+        """Emit r<n> = expr and mark the register dirty."""
+        self.lines.append(f"r{r} = {expr}")
+        self.dirty.add(r)
+
+    def emit(self, line):
+        self.lines.append(line)
+
+    def writeback(self, indent=""):
+        """Emit stores for every dirty register."""
+        for r in sorted(self.dirty):
+            self.lines.append(f"{indent}reg[{r}] = r{r}")
+
+    def exit(self, pc_expr, indent=""):
+        """Emit the register writeback and return the next pc."""
+        self.writeback(indent)
+        self.lines.append(f"{indent}return {pc_expr}")
+
+    def bail_out(self, pc_expr):
+        """
+        Emit an early exit from the middle of the block. The run loop
+        counts whole blocks, so record the instructions we skip.
+        """
+        if self.remaining:
+            self.lines.append(f"    cpu.overcount += {self.remaining}")
+        self.exit(pc_expr, indent="    ")
+
+    def check_write(self, next_pc):
+        """
+        After a guest store, bail out to next_pc if the store invalidated
+        this block.
+        """
+        self.lines.append(f"if blocks[{self.start}] is None:")
+        self.bail_out(next_pc)
+
+    def check_pending(self, next_pc):
+        """
+        After a write to IM or IS, leave the block if the write made an
+        interrupt pending; the run loop delivers it before next_pc.
+        """
+        self.writeback()
+        self.lines.append("if cpu.update_pending():")
+        if self.remaining:
+            self.lines.append(f"    cpu.overcount += {self.remaining}")
+        self.lines.append(f"    raise Pending({next_pc})")
+
+    def source(self, factory="make"):
+        """Return the source of the factory that builds the block closure."""
+        body = [f"r{r} = reg[{r}]" for r in sorted(self.loaded)] + self.lines
+        name = f"block_{self.start:02X}"
+        out = [
+            f"def {factory}(cpu, reg, ram, write, blocks, table):",
+            f"    def {name}():",
+        ]
+        out += [f"        {line}" for line in body]
+        out.append(f"    return {name}")
+        return "\n".join(out)
+
+
+def emit_call(e, opcode, a, b, next_pc):
+    """
+    Emit a call to the interpreter's handler: sync registers, call it and
+    reload everything it may have touched.
+    """
+    e.writeback()
+    e.emit(f"pc = table[{opcode}]({a}, {b}, {next_pc})")
+    for r in range(8):
+        e.emit(f"r{r} = reg[{r}]")
+        e.loaded.add(r)
+    e.dirty.update(range(8))
+    e.compared = False
+    if DECODE_TABLE[opcode].sets_pc:
+        e.emit(f"if pc != {next_pc} or blocks[{e.start}] is None:")
+    else:
+        e.emit(f"if blocks[{e.start}] is None:")
+    e.bail_out("pc")
+
+
+def emit_instruction(e, pc, opcode, a, b, next_pc):
+    """Emit the Python for one instruction. Returns True if the block ends."""
+    sp = 7
+
+    if can_fault(opcode, a, b):
+        # alone in its block, see scan_block; the handler faults exactly
+        # where the interpreter would, and not at all on a jump not taken
+        emit_call(e, opcode, a, b, next_pc)
+
+    elif opcode == LDI:
+        e.assign(a, b)
+
+    elif opcode == LD:
+        e.use(b)
+        e.assign(a, f"ram[r{b}]")
+
+    elif opcode in ALU_EXPRESSIONS:
+        if FORMS[opcode] == "rr":
+            e.use(a, b)
+        else:
+            e.use(a)
+        e.assign(a, ALU_EXPRESSIONS[opcode].format(a=a, b=b))
+
+    elif opcode == NOP:
+        pass
+
+    elif opcode == CMP:
+        e.use(a, b)
+        e.emit(f"cpu.cmp_a = c_a = r{a}")
+        e.emit(f"cpu.cmp_b = c_b = r{b}")
+        e.compared = True
+
+    elif opcode == PRN:
+        e.use(a)
+        e.emit(f"cpu.output.write(f'{{r{a}}}\\n')")
+
+    elif opcode == PRA:
+        e.use(a)
+        e.emit(f"cpu.output.write(chr(r{a}))")
+
+    elif opcode == ST:
+        e.use(a, b)
+        e.emit(f"write(r{a}, r{b})")
+        e.check_write(next_pc)
+
+    elif opcode == PUSH:
+        e.use(sp, a)
+        e.assign(sp, f"(r{sp} - 1) & 0xFF")
+        e.emit(f"write(r{sp}, r{a})")
+        e.check_write(next_pc)
+
+    elif opcode == POP:
+        e.use(sp)
+        e.assign(a, f"ram[r{sp}]")
+        e.assign(sp, f"(r{sp} + 1) & 0xFF")
+
+    elif opcode == CALL:
+        e.use(sp)
+        e.assign(sp, f"(r{sp} - 1) & 0xFF")
+        e.emit(f"write(r{sp}, {next_pc})")
+        e.use(a)
+        e.exit(f"r{a}")
+        return True
+
+    elif opcode == RET:
+        e.use(sp)
+        e.emit(f"pc = ram[r{sp}]")
+        e.assign(sp, f"(r{sp} + 1) & 0xFF")
+        e.exit("pc")
+        return True
+
+    elif opcode == JMP:
+        e.use(a)
+        e.exit(f"r{a}")
+        return True
+
+    elif opcode in COMPARISONS:
+        # a CMP earlier in the block saves reading its operands back
+        e.use(a)
+        left, right = (("c_a", "c_b") if e.compared
+                       else ("cpu.cmp_a", "cpu.cmp_b"))
+        e.emit(f"if {left} {COMPARISONS[opcode]} {right}:")
+        e.exit(f"r{a}", indent="    ")
+        e.exit(next_pc)
+        return True
+
+    elif opcode == HLT:
+        e.writeback()
+        e.emit(f"raise Halt({next_pc})")
+        return True
+
+    else:
+        # no inline form
+        emit_call(e, opcode, a, b, next_pc)
+
+    if opcode in REGISTER_WRITERS and (a == IM or a == IS):
+        e.check_pending(next_pc)
+
+    return False
+
+
+def emit_block(cpu, instructions):
+    """Return the Emitter holding the code of a block scanned by scan_block."""
+    e = Emitter(instructions[0][0])
+    ended = False
+
+    for i, (pc, opcode, a, b, next_pc) in enumerate(instructions):
+        e.remaining = len(instructions) - i - 1
+        if cpu.branchtable[opcode] == cpu.handle_trap:
+            e.writeback()
+            e.emit(f"return table[{opcode}]({opcode}, {pc}, {next_pc})")
+            ended = True
+            break
+        ended = emit_instruction(e, pc, opcode, a, b, next_pc)
+
+    if not ended:
+        # fell off the end of a long block, continue at the next address
+        e.exit(instructions[-1][4])
+
+    return e
+
+
+def block_size(instructions):
+    """Number of bytes a scanned block covers."""
+    last_pc, last_opcode = instructions[-1][:2]
+    return last_pc + SIZES[last_opcode] - instructions[0][0]
+
+
+def compile_block(cpu, start):
+    """
+    Compile the basic block at start into a closure that runs it and
+    returns the next pc. The function carries the instruction count in
+    .length and the number of bytes it covers in .size.
+    """
+    instructions = scan_block(cpu.ram, start, cpu.branchtable,
+                              cpu.handle_trap)
+    namespace = {"Halt": Halt, "Pending": Pending}
+    exec(emit_block(cpu, instructions).source(), namespace)
+    block = namespace["make"](cpu, cpu.reg, cpu.ram, cpu.write, cpu.blocks,
+                              cpu.branchtable)
+    block.length = len(instructions)
+    block.size = block_size(instructions)
+    return block
@@ -1,79 +1,334 @@
 """CPU functionality."""
 
 import sys
+import time
+from array import array
+from itertools import count
+
+from image import is_image, load_image
+from isa import *
+from sinks import StdoutSink
+
+# FL bits, laid out 00000LGE
+FL_LESS    = 0b00000100
+FL_GREATER = 0b00000010
+FL_EQUAL   = 0b00000001
+
+# Conditional jump -> (FL bits it tests, True if it jumps when one is set)
+CONDITIONAL_JUMPS = {
+    JEQ: (FL_EQUAL, True),
+    JNE: (FL_EQUAL, False),
+    JGT: (FL_GREATER, True),
+    JLT: (FL_LESS, True),
+    JLE: (FL_LESS | FL_EQUAL, True),
+    JGE: (FL_GREATER | FL_EQUAL, True),
+}
+
+# Execution engines
+INTERPRETER = "interpreter"  # fetch and decode every instruction (reference)
+CACHED      = "cached"       # reuse decoded instructions by address
+COMPILED    = "compiled"     # run whole basic blocks as Python closures
+
+ENGINES = (INTERPRETER, CACHED, COMPILED)
+
+# Power-on contents: RAM cleared, registers cleared except SP
+ZERO_RAM = bytes(256)
+POWER_ON_REG = array('B', [0, 0, 0, 0, 0, 0, 0, 0xF4])
+
+# Reserved registers
+IM = 5  # interrupt mask
+IS = 6  # interrupt status
+SP = 7  # stack pointer
+
+# I0 handler address lives at 0xF8, I7 at 0xFF
+INTERRUPT_VECTORS = 0xF8
+
+# The keyboard leaves the most recent key here
+KEY_ADDRESS = 0xF4
+
+# IM & IS -> number of the interrupt to take first (lowest bit wins)
+LOWEST_SET_BIT = [0] + [(n & -n).bit_length() - 1 for n in range(1, 256)]
+
+# Opcodes that can write their register operand a, and so change IM or IS:
+# the loads, POP, and every ALU instruction but CMP
+REGISTER_WRITERS = {LDI, LD, POP} | {
+    entry.code for entry in DECODE_TABLE
+    if entry.mnemonic is not None and entry.alu and entry.code != CMP}
+
+# Instructions that touch nothing but registers, FL and the pc. A loop made
+# only of these that comes back to where it started with the same registers
+# and FL will spin until an interrupt arrives. DIV and MOD are left out
+# because they can fault.
+SPIN_SAFE = ({NOP, LDI, CMP, JMP} | set(CONDITIONAL_JUMPS) |
+             REGISTER_WRITERS - {LD, POP, DIV, MOD})
+
+# Instructions in the ISA table that the CPU deliberately has no handler
+# for; they trap like undefined opcodes
+UNIMPLEMENTED = set()
+
+# Longest idle loop looked for, in instructions
+IDLE_LOOP_LIMIT = 16
+
+# Instructions between device polls and looks for an idle loop when devices
+# are attached. The first look after an interrupt comes IDLE_CHECK_FIRST
+# instructions in, so a handler that returns to an idle loop is caught
+# quickly, and the gap doubles from there.
+IDLE_CHECK_FIRST = 32
+IDLE_CHECK_INTERVAL = 4096
+
+# Fresh contents for the 256-entry caches
+EMPTY = [None] * 256
+
+# Why a run stopped
+HALTED  = "halted"   # executed HLT
+TRAPPED = "trapped"  # fetched an undefined opcode
+FAULTED = "faulted"  # named a register that does not exist, or divided by 0
+BUDGET  = "budget"   # used up its max_steps, can be resumed
+REACHED = "reached"  # got to the address given to run_until, can be resumed
+IDLE    = "idle"     # waiting in an idle loop for an interrupt, can be resumed
+
+
+class Halt(Exception):
+    """Raised by HLT to leave the run loop."""
+
+    def __init__(self, next_pc):
+        super().__init__(next_pc)
+        self.next_pc = next_pc
+
+
+class Trap(Exception):
+    """Raised when the CPU fetches an opcode it has no handler for."""
+
+    def __init__(self, opcode, address):
+        super().__init__(f"Unknown instruction: {opcode:>08b}")
+        self.opcode = opcode
+        self.address = address
+
+
+class Pending(Exception):
+    """
+    Raised by an instruction that left an enabled interrupt pending, so the
+    run loop delivers it before the next instruction.
+    """
+
+    def __init__(self, next_pc):
+        super().__init__(next_pc)
+        self.next_pc = next_pc
+
+
+class Flags:
+    """
+    FL set as a byte (at power-on or by IRET) rather than by CMP. It stands
+    in for the left compare operand: comparing it with anything answers from
+    its L, G and E bits, so the jump handlers need no special case.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value & FL_EQUAL != 0
+
+    def __ne__(self, other):
+        return self.value & FL_EQUAL == 0
+
+    def __lt__(self, other):
+        return self.value & FL_LESS != 0
+
+    def __gt__(self, other):
+        return self.value & FL_GREATER != 0
+
+    def __le__(self, other):
+        return self.value & (FL_LESS | FL_EQUAL) != 0
+
+    def __ge__(self, other):
+        return self.value & (FL_GREATER | FL_EQUAL) != 0
+
+
+class RunResult:
+    """
+    Why a run stopped: the reason, the pc and opcode of the instruction
+    that stopped it, and how many instructions were retired.
+    """
+
+    def __init__(self, reason, pc, opcode, instructions):
+        self.reason = reason
+        self.pc = pc
+        self.opcode = opcode
+        self.instructions = instructions
+
+    def __repr__(self):
+        return (f"RunResult({self.reason!r}, pc={self.pc:#04x}, "
+                f"opcode={self.opcode:#04x}, "
+                f"instructions={self.instructions})")
 
-HLT  = 1    # 0b00000001
-RET  = 17   # 0b00010001
-PRN  = 71   # 0b01000111
-PUSH = 69   # 0b01000101
-POP  = 70   # 0b01000110
-CALL = 80   # 0b01010000
-JMP  = 84   # 0b01010100
-JEQ  = 85   # 0b01010101
-JNE  = 86   # 0b01010110
-LDI  = 130  # 0b10000010 
-ADD  = 160  # 0b10100000
-MUL  = 162  # 0b10100010
-CMP  = 167  # 0b10100111
 
 class CPU:
     """Main CPU class."""
 
-    def __init__(self):
+    def __init__(self, engine=CACHED, output=None, timer=None, keyboard=None):
         """Construct a new CPU."""
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}")
+        self.engine = engine
+        # where PRN and PRA write, see sinks.py
+        self.output = output if output is not None else StdoutSink()
         # 256 bytes of RAM
-        self.ram = [0] * 256
-        # 8 bytes of register
-        self.reg = [0] * 8
+        self.ram = bytearray(256)
+        # 8 bytes of register, unsigned 8-bit cells, with the stack pointer
+        # initialised to 0xF4, just below the key and interrupt vectors
+        self.reg = array('B', POWER_ON_REG)
         # program counter
         self.pc = 0
         # stack pointer register address (default to 7)
-        self.sp = 7
-        # stack pointer initialiaed to high memory address from RAM
-        self.reg[self.sp] = 255
+        self.sp = SP
         # instruction register for address of currently executing subroutine
         self.ir = 0
-        # flag for 00000LGE for less, greater, equal comparisons
+        # operands of the last CMP; FL (00000LGE for less, greater, equal)
+        # is only worked out from them when something reads self.flag
+        self.cmp_a = Flags(0b00000000)
+        self.cmp_b = 0
+        # cleared while an interrupt handler runs, set again by IRET
+        self.interrupts_enabled = True
+        # True while an enabled interrupt is raised and unmasked; only
+        # recomputed when IM, IS or interrupts_enabled change
+        self.pending = False
+        # I0 source, see devices.py; None means the timer never fires
+        self.timer = timer
+        # I1 source, see devices.py; None means no keys ever arrive
+        self.keyboard = keyboard
+        # time spent blocked in idle loops: host seconds, and instructions
+        # retired without running them
+        self.idle_time = 0.0
+        self.idle_instructions = 0
+        # counters filled while attached, see profiler.py; None means runs
+        # use the engine's own loop untouched
+        self.profile = None
+        # ring buffer of recent instructions, see tracer.py; None means
+        # untraced, like profile
+        self.tracer = None
+        # True while run_async is parked waiting for an interrupt
+        self.parked = False
+        # instructions a compiled block counted but skipped by bailing out
+        self.overcount = 0
+        # opcode byte -> bound handler, built once per CPU
+        self.branchtable = self.build_branchtable()
+        # address -> (handler, operand_a, operand_b, next_pc), filled the
+        # first time an address runs
+        self.decoded = [None] * 256
+        # the same for the cached engine, with common instruction pairs
+        # fused into one entry, see fusion.py
+        self.fused = [None] * 256
+        # dispatches the cached engine saved by running fused pairs
+        self.dispatches_saved = 0
+        # block start address -> compiled block function
+        self.blocks = [None] * 256
+        # address -> start addresses of compiled blocks covering that byte
+        self.covering = [None] * 256
+        # True while blocks holds an ahead-of-time translation, see aot.py;
+        # addresses without a block then run from the decode cache rather
+        # than being compiled
+        self.translated = False
+
+    def reset(self):
+        """
+        Return to the power-on state, clearing RAM, registers and caches in
+        place so the same buffers can run the next program.
+        """
+        self.ram[:] = ZERO_RAM
+        self.reg[:] = POWER_ON_REG
+        self.pc = 0
+        self.ir = 0
         self.flag = 0b00000000
+        self.interrupts_enabled = True
+        self.pending = False
+        self.idle_time = 0.0
+        self.idle_instructions = 0
+        self.dispatches_saved = 0
+        if self.timer is not None:
+            self.timer.reset()
+        self.flush()
+
+    @property
+    def flag(self):
+        """FL as a byte, materialized from the last compare."""
+        a = self.cmp_a
+        if type(a) is Flags:
+            return a.value
+        b = self.cmp_b
+        if a == b:
+            return FL_EQUAL
+        return FL_LESS if a < b else FL_GREATER
+
+    @flag.setter
+    def flag(self, value):
+        self.cmp_a = Flags(value)
+        self.cmp_b = 0
 
     def load(self, filepath):
-        """Load a program into memory."""
-        program = []
-        address = 0
-        try:
+        """
+        Load a program into memory. Binary .ls8b images are read straight
+        into RAM; text .ls8 files are parsed one base-2 byte per line.
+        Returns the number of bytes loaded. Raises FileNotFoundError if the
+        file does not exist, and ValueError if it is malformed or does not
+        fit in RAM, whatever its format.
+        """
+        if is_image(filepath):
+            address = load_image(filepath, self.ram)
+        else:
+            code = []
             with open(filepath, 'r') as f:
                 for line in f:
-                    # Ignore comments
-                    comment_split = line.split("#")
-                    # Strip out whitespace
-                    num = comment_split[0].strip()
+                    # Ignore comments and strip out whitespace
+                    num = line.split("#", 1)[0].strip()
                     # Ignore blank lines
                     if num == '':
                         continue
-                    program.append('0b' + num)
-                    # print(program)
-            for instruction in program:
-                self.ram[address] = eval(instruction)
-                address += 1
+                    code.append(int(num, 2))
+            if len(code) > 256:
+                raise ValueError(f"program is {len(code)} bytes, RAM is 256")
+            address = len(code)
+            self.ram[:address] = bytes(code)
+        self.flush()
+        return address
 
-        except FileNotFoundError:
-            print("File not found")
-            sys.exit(2)
+    def load_image(self, image):
+        """
+        Load an Image, such as asm.assemble() returns, by copying its code
+        into RAM. Returns the number of bytes loaded.
+        """
+        code = image.code
+        self.ram[:len(code)] = code
+        self.flush()
+        return len(code)
 
     def alu(self, op, reg_a, reg_b=0):
-        """ALU operations."""
+        """
+        ALU operations. Results are masked to 8 bits as the spec requires.
+        The instruction handlers do the same arithmetic inline, so running
+        a program never goes through this chain of comparisons.
+        """
 
         if op == "ADD":
-            self.reg[reg_a] += self.reg[reg_b]
+            self.reg[reg_a] = (self.reg[reg_a] + self.reg[reg_b]) & 0xFF
+        elif op == "SUB":
+            self.reg[reg_a] = (self.reg[reg_a] - self.reg[reg_b]) & 0xFF
         elif op == "MUL":
-            self.reg[reg_a] *= self.reg[reg_b]
+            self.reg[reg_a] = (self.reg[reg_a] * self.reg[reg_b]) & 0xFF
+        elif op == "DIV":
+            # raises ZeroDivisionError, which faults, for a zero divisor
+            self.reg[reg_a] = self.reg[reg_a] // self.reg[reg_b]
+        elif op == "MOD":
+            self.reg[reg_a] = self.reg[reg_a] % self.reg[reg_b]
+        elif op == "INC":
+            self.reg[reg_a] = (self.reg[reg_a] + 1) & 0xFF
+        elif op == "DEC":
+            self.reg[reg_a] = (self.reg[reg_a] - 1) & 0xFF
         elif op == "CMP":
-            if self.reg[reg_a] < self.reg[reg_b]:
-                self.flag = 0b00000100
-            elif self.reg[reg_a] < self.reg[reg_b]:
-                self.flag = 0b00000010
-            elif self.reg[reg_a] == self.reg[reg_b]:
-                self.flag = 0b00000001
+            self.cmp_a = self.reg[reg_a]
+            self.cmp_b = self.reg[reg_b]
         elif op == "AND":
             self.reg[reg_a] = self.reg[reg_a] & self.reg[reg_b]
         elif op == "OR":
@@ -81,9 +336,9 @@ class CPU:
         elif op == "XOR":
             self.reg[reg_a] = self.reg[reg_a] ^ self.reg[reg_b]
         elif op == "NOT":
-            self.reg[reg_a] = ~self.reg[reg_a]
+            self.reg[reg_a] = ~self.reg[reg_a] & 0xFF
         elif op == "SHL":
-            self.reg[reg_a] = self.reg[reg_a] << self.reg[reg_b]
+            self.reg[reg_a] = (self.reg[reg_a] << self.reg[reg_b]) & 0xFF
         elif op == "SHR":
             self.reg[reg_a] = self.reg[reg_a] >> self.reg[reg_b]
 
@@ -120,137 +375,974 @@ class CPU:
         """
         write a byte to RAM
         """
+        self.write(address, byte)
+
+    def write(self, address, byte):
+        """
+        Store a byte and drop any decoded instruction or compiled block that
+        covers it. Instructions are at most 3 bytes long, so only the decode
+        entries starting at address, address - 1 and address - 2 can overlap
+        the write; fused pairs are at most 5 bytes long.
+        """
         self.ram[address] = byte
+        decoded = self.decoded
+        decoded[address] = None
+        decoded[address - 1] = None
+        decoded[address - 2] = None
+        fused = self.fused
+        fused[address] = None
+        fused[address - 1] = None
+        fused[address - 2] = None
+        fused[address - 3] = None
+        fused[address - 4] = None
+        if self.covering[address]:
+            self.invalidate_blocks(address)
 
-    def run(self):
-        """Run the CPU."""
-        running = True
-        self.pc = 0
-        while running:
-            command = self.ram[self.pc]
-
-            if command == HLT:
-                running = False
-                self.pc += 1
-
-            elif command == LDI:
-                # load a piece of data in to the register
-                # register address in self.pc + 1
-                # data to load in register in self.pc + 2
-                reg_addr = self.ram[self.pc + 1] 
-                data = self.ram[self.pc + 2]
-                # print(f"data loaded {data:>08b}")
-                self.reg[reg_addr] = data
-                self.pc += 3
-
-            elif command == PRN:
-                # print argument stored in register
-                # register address at self.pc + 1
-                reg_addr = self.ram[self.pc + 1] 
-                print(self.reg[reg_addr])
-                self.pc += 2
-
-            elif command == CMP:
-                # compares operands a and b stored in the register
-                # register addresses for operand a in self.pc + 1 
-                # register address for operand b in self.pc + 2
-                # return result to flag
-                # implement with ALU
-                op_a_addr = self.ram[self.pc + 1]
-                op_b_addr = self.ram[self.pc + 2]
-                self.alu("CMP", op_a_addr, op_b_addr)
-                # print(f"comparison result: {self.flag:>0b}")
-                self.pc += 3
-
-            elif command == ADD:
-                # adds operands a and b stored in the register
-                # register addresses for operand a in self.pc + 1 
-                # register address for operand b in self.pc + 2
-                # return result to R0
-                # implement with ALU
-                op_a_addr = self.ram[self.pc + 1]
-                op_b_addr = self.ram[self.pc + 2]
-                self.alu("ADD", op_a_addr, op_b_addr)
-                self.pc += 3
-
-            elif command == MUL:
-                # multiply operands a and b stored in the register
-                # register addresses for operand a in self.pc + 1 
-                # register address for operand b in self.pc + 2
-                # return result to R0
-                # implement with ALU
-                op_a_addr = self.ram[self.pc + 1]
-                op_b_addr = self.ram[self.pc + 2]
-                self.alu("MUL", op_a_addr, op_b_addr)
-                self.pc += 3
-                # implement with direct code
-                # op_a_addr = self.ram[self.pc + 1]
-                # op_b_addr = self.ram[self.pc + 2]
-                # op_a = self.reg[op_a_addr]
-                # op_b = self.reg[op_b_addr]
-                # result = op_a * op_b
-                # self.reg[0] = result
-                # self.pc += 3
-
-            elif command == PUSH:
-                # moves an item from the register address at pc + 1 into the stack
-                # decrements the memory address stored in the stack pointer
-                reg_addr = self.ram[self.pc + 1]
-                # get value to place in stack from register address at pc + 1
-                value = self.reg[reg_addr]
-                # decrement the memory address stored in the stack pointer
-                self.reg[self.sp] -= 1
-                # copy the value onto the stack in memory
-                self.ram[self.reg[self.sp]] = value
-                self.pc += 2
-
-            elif command == POP:
-                # move an item off the stack and into the register address at pc + 1
-                # increments the memory address stored in the stack pointer
-                reg_addr = self.ram[self.pc + 1]
-                # get value to place in register from stack
-                value = self.ram[self.reg[self.sp]]
-                # copy the value to the register address
-                self.reg[reg_addr] = value
-                # increment the memory address stored in the stack pointer
-                self.reg[self.sp] += 1
-                self.pc += 2
-
-            elif command == CALL:
-                # The address of the instruction directly after CALL is pushed onto the stack.
-                # the place to return is at pc + 2
-                # This allows us to return to where we left off when the subroutine finishes executing.
-                self.reg[self.sp] -= 1
-                self.ram[self.reg[self.sp]] = self.pc + 2
-                # The PC is set to the address stored in the given register.
-                # We jump to that location in RAM and execute the first instruction in the subroutine.
-                # The PC can move forward or backwards from its current location.
-                self.pc = self.reg[self.ram[self.pc + 1]]
-
-            elif command == RET:
-                # Return from subroutine.
-                # Pop the value from the top of the stack and store it in the PC.
-                self.pc = self.ram[self.reg[self.sp]]
-                self.reg[self.sp] += 1
-
-            elif command == JMP:
-                # If `equal` flag is set (true), jump to the address stored in the given register.
-                self.pc = self.reg[self.ram[self.pc + 1]]
-
-            elif command == JEQ:
-                # if equal flag true, jump to the address stored in the given register.
-                if self.flag & 0b00000001 is 1:
-                    self.pc = self.reg[self.ram[self.pc + 1]]
+    def flush(self):
+        """Drop every cached decode entry and compiled block."""
+        # slice assignment keeps the lists that compiled blocks hold on to
+        self.decoded[:] = EMPTY
+        self.fused[:] = EMPTY
+        self.blocks[:] = EMPTY
+        self.covering[:] = EMPTY
+        self.translated = False
+
+    def compile_block(self, start):
+        """Compile the block at start and record the bytes it covers."""
+        from compiler import compile_block
+
+        return self.add_block(start, compile_block(self, start))
+
+    def decoded_block(self, start):
+        """
+        Wrap the decoded instruction at start as a one-instruction block,
+        for addresses an ahead-of-time translation has no block for.
+        """
+        entry = self.decoded[start]
+        if entry is None:
+            entry = self.decode(start)
+        handler, a, b, next_pc = entry
+
+        def block():
+            return handler(a, b, next_pc)
+        block.length = 1
+        block.size = SIZES[self.ram[start]]
+        return self.add_block(start, block)
+
+    def add_block(self, start, block):
+        """Install a block function at start and record the bytes it covers."""
+        self.blocks[start] = block
+        covering = self.covering
+        for address in range(start, start + block.size):
+            address &= 0xFF
+            if covering[address] is None:
+                covering[address] = [start]
+            else:
+                covering[address].append(start)
+        return block
+
+    def fuse(self, pc):
+        """Decode the instruction at pc, fused with the next if they pair."""
+        from fusion import fuse
+
+        return fuse(self, pc)
+
+    def invalidate_blocks(self, address):
+        """Drop every compiled block that covers address."""
+        covering = self.covering
+        starts = covering[address]
+        covering[address] = None
+        for start in starts:
+            block = self.blocks[start]
+            if block is None:
+                continue
+            self.blocks[start] = None
+            for covered in range(start, start + block.size):
+                others = covering[covered & 0xFF]
+                if others is not None and start in others:
+                    others.remove(start)
+
+    def handle_nop(self, a, b, next_pc):
+        return next_pc
+
+    def handle_hlt(self, a, b, next_pc):
+        raise Halt(next_pc)
+
+    def handle_ldi(self, a, b, next_pc):
+        # load the immediate b into register a
+        self.reg[a] = b
+        return next_pc
+
+    def handle_ld(self, a, b, next_pc):
+        # load register a with the byte at the address in register b
+        self.reg[a] = self.ram[self.reg[b]]
+        return next_pc
+
+    def handle_prn(self, a, b, next_pc):
+        # print the value stored in register a
+        self.output.write(f"{self.reg[a]}\n")
+        return next_pc
+
+    def handle_pra(self, a, b, next_pc):
+        # print the ASCII character stored in register a
+        self.output.write(chr(self.reg[a]))
+        return next_pc
+
+    def handle_cmp(self, a, b, next_pc):
+        # compare registers a and b: keep both, FL is worked out on demand.
+        # Both are read before either is kept, so a fault leaves FL alone.
+        reg = self.reg
+        self.cmp_a, self.cmp_b = reg[a], reg[b]
+        return next_pc
+
+    def handle_add(self, a, b, next_pc):
+        # add register b to register a
+        reg = self.reg
+        reg[a] = (reg[a] + reg[b]) & 0xFF
+        return next_pc
+
+    def handle_sub(self, a, b, next_pc):
+        # subtract register b from register a
+        reg = self.reg
+        reg[a] = (reg[a] - reg[b]) & 0xFF
+        return next_pc
+
+    def handle_mul(self, a, b, next_pc):
+        # multiply register a by register b
+        reg = self.reg
+        reg[a] = (reg[a] * reg[b]) & 0xFF
+        return next_pc
+
+    def handle_div(self, a, b, next_pc):
+        # divide register a by register b; faults if b holds 0
+        reg = self.reg
+        reg[a] = reg[a] // reg[b]
+        return next_pc
+
+    def handle_mod(self, a, b, next_pc):
+        # remainder of register a divided by register b; faults if b holds 0
+        reg = self.reg
+        reg[a] = reg[a] % reg[b]
+        return next_pc
+
+    def handle_inc(self, a, b, next_pc):
+        # add 1 to register a
+        reg = self.reg
+        reg[a] = (reg[a] + 1) & 0xFF
+        return next_pc
+
+    def handle_dec(self, a, b, next_pc):
+        # subtract 1 from register a
+        reg = self.reg
+        reg[a] = (reg[a] - 1) & 0xFF
+        return next_pc
+
+    def handle_and(self, a, b, next_pc):
+        # bitwise AND of registers a and b, into a
+        reg = self.reg
+        reg[a] = reg[a] & reg[b]
+        return next_pc
+
+    def handle_or(self, a, b, next_pc):
+        # bitwise OR of registers a and b, into a
+        reg = self.reg
+        reg[a] = reg[a] | reg[b]
+        return next_pc
+
+    def handle_xor(self, a, b, next_pc):
+        # bitwise XOR of registers a and b, into a
+        reg = self.reg
+        reg[a] = reg[a] ^ reg[b]
+        return next_pc
+
+    def handle_not(self, a, b, next_pc):
+        # bitwise NOT of register a
+        reg = self.reg
+        reg[a] = ~reg[a] & 0xFF
+        return next_pc
+
+    def handle_shl(self, a, b, next_pc):
+        # shift register a left by register b
+        reg = self.reg
+        reg[a] = (reg[a] << reg[b]) & 0xFF
+        return next_pc
+
+    def handle_shr(self, a, b, next_pc):
+        # shift register a right by register b
+        reg = self.reg
+        reg[a] = reg[a] >> reg[b]
+        return next_pc
+
+    def handle_st(self, a, b, next_pc):
+        # store the value in register b at the address in register a
+        self.write(self.reg[a], self.reg[b])
+        return next_pc
+
+    def handle_push(self, a, b, next_pc):
+        # decrement the stack pointer, then copy register a onto the stack
+        self.reg[self.sp] = (self.reg[self.sp] - 1) & 0xFF
+        self.write(self.reg[self.sp], self.reg[a])
+        return next_pc
+
+    def handle_pop(self, a, b, next_pc):
+        # copy the top of the stack into register a, then increment the
+        # stack pointer
+        self.reg[a] = self.ram[self.reg[self.sp]]
+        self.reg[self.sp] = (self.reg[self.sp] + 1) & 0xFF
+        return next_pc
+
+    def handle_call(self, a, b, next_pc):
+        # The address of the instruction directly after CALL is pushed onto
+        # the stack so we can return to where we left off.
+        self.reg[self.sp] = (self.reg[self.sp] - 1) & 0xFF
+        self.write(self.reg[self.sp], next_pc)
+        # The PC is set to the address stored in the given register.
+        return self.reg[a]
+
+    def handle_ret(self, a, b, next_pc):
+        # Pop the value from the top of the stack and store it in the PC.
+        pc = self.ram[self.reg[self.sp]]
+        self.reg[self.sp] = (self.reg[self.sp] + 1) & 0xFF
+        return pc
+
+    def handle_jmp(self, a, b, next_pc):
+        # Jump to the address stored in the given register.
+        return self.reg[a]
+
+    def handle_jeq(self, a, b, next_pc):
+        # if equal flag true, jump to the address stored in the given register.
+        if self.cmp_a == self.cmp_b:
+            return self.reg[a]
+        return next_pc
+
+    def handle_jne(self, a, b, next_pc):
+        # if equal flag false, jump to the address stored in the given register.
+        if self.cmp_a != self.cmp_b:
+            return self.reg[a]
+        return next_pc
+
+    def handle_jgt(self, a, b, next_pc):
+        # if greater-than flag true, jump to the address in the register.
+        if self.cmp_a > self.cmp_b:
+            return self.reg[a]
+        return next_pc
+
+    def handle_jlt(self, a, b, next_pc):
+        # if less-than flag true, jump to the address in the register.
+        if self.cmp_a < self.cmp_b:
+            return self.reg[a]
+        return next_pc
+
+    def handle_jle(self, a, b, next_pc):
+        # if less-than or equal flag true, jump to the address in the
+        # register.
+        if self.cmp_a <= self.cmp_b:
+            return self.reg[a]
+        return next_pc
+
+    def handle_jge(self, a, b, next_pc):
+        # if greater-than or equal flag true, jump to the address in the
+        # register.
+        if self.cmp_a >= self.cmp_b:
+            return self.reg[a]
+        return next_pc
+
+    def handle_int(self, a, b, next_pc):
+        # raise the interrupt numbered in register a, delivered before the
+        # next instruction
+        self.raise_interrupt(self.reg[a] & 7)
+        return self.interrupt(next_pc)
+
+    def handle_iret(self, a, b, next_pc):
+        # pop R6-R0, FL and the return address, then re-enable interrupts
+        reg = self.reg
+        ram = self.ram
+        for r in range(6, -1, -1):
+            reg[r] = ram[reg[SP]]
+            reg[SP] = (reg[SP] + 1) & 0xFF
+        self.flag = ram[reg[SP]]
+        reg[SP] = (reg[SP] + 1) & 0xFF
+        pc = ram[reg[SP]]
+        reg[SP] = (reg[SP] + 1) & 0xFF
+        self.interrupts_enabled = True
+        self.update_pending()
+        # anything that arrived while the handler ran goes next
+        return self.interrupt(pc)
+
+    def handle_trap(self, command, address, next_pc):
+        # every opcode without a handler lands here; decode() passes the
+        # opcode and its address in place of the operands
+        raise Trap(command, address)
+
+    def build_branchtable(self):
+        """
+        Build the 256-entry dispatch table of bound handlers, indexed by
+        opcode byte, from the ISA table: the instruction called NAME is
+        handled by handle_name. Undefined and unimplemented opcodes all
+        share the trap handler.
+        """
+        table = [self.handle_trap] * 256
+        for entry in DECODE_TABLE:
+            name = entry.mnemonic
+            if name is not None and name not in UNIMPLEMENTED:
+                table[entry.code] = getattr(self, f"handle_{name.lower()}")
+        return table
+
+    def update_pending(self):
+        """
+        Recompute the pending flag after IM, IS or interrupts_enabled
+        changed. Returns the new value.
+        """
+        self.pending = (self.interrupts_enabled and
+                        (self.reg[IM] & self.reg[IS]) != 0)
+        return self.pending
+
+    def raise_interrupt(self, n):
+        """Set bit n of IS, as a device or INT does."""
+        self.reg[IS] |= 1 << n
+        self.update_pending()
+
+    def interrupt(self, pc):
+        """
+        If an interrupt is pending, enter the lowest-numbered one: clear its
+        IS bit, push the pc, FL and R0-R6, and return the vector address.
+        Otherwise return pc.
+        """
+        if not self.pending:
+            return pc
+        reg = self.reg
+        n = LOWEST_SET_BIT[reg[IM] & reg[IS]]
+
+        self.interrupts_enabled = False
+        self.pending = False
+        reg[IS] &= ~(1 << n) & 0xFF
+        for value in [pc, self.flag] + list(reg[0:7]):
+            reg[SP] = (reg[SP] - 1) & 0xFF
+            self.write(reg[SP], value)
+        return self.ram[INTERRUPT_VECTORS + n]
+
+    def idle_loop(self):
+        """
+        If the pc sits in a loop of SPIN_SAFE instructions that comes back
+        to the same pc with the same registers and FL, return its length in
+        instructions; only an interrupt can get the CPU out of it. Otherwise
+        return 0. The loop is tried once on the real registers and FL, which
+        are put back afterwards.
+        """
+        reg = self.reg
+        ram = self.ram
+        branchtable = self.branchtable
+        saved = array('B', reg)
+        cmp_a = self.cmp_a
+        cmp_b = self.cmp_b
+        flag = self.flag
+        start = pc = self.pc
+        try:
+            for n in range(1, IDLE_LOOP_LIMIT + 1):
+                command = ram[pc]
+                if command not in SPIN_SAFE:
+                    return 0
+                pc = branchtable[command](ram[(pc + 1) & 0xFF],
+                                          ram[(pc + 2) & 0xFF],
+                                          (pc + SIZES[command]) & 0xFF)
+                if pc == start:
+                    return n if reg == saved and self.flag == flag else 0
+            return 0
+        except IndexError:
+            return 0
+        finally:
+            reg[:] = saved
+            self.cmp_a = cmp_a
+            self.cmp_b = cmp_b
+
+    def listening(self, device):
+        """
+        True if the guest can take an interrupt from device now: it is
+        enabled in IM, not already raised in IS, and no handler is running.
+        """
+        bit = 1 << device.interrupt
+        return (self.interrupts_enabled and self.reg[IM] & bit and
+                not self.reg[IS] & bit)
+
+    def poll_devices(self):
+        """Raise the interrupt of every device that has something to report."""
+        timer = self.timer
+        if timer is not None and timer.due():
+            self.raise_interrupt(timer.interrupt)
+        keyboard = self.keyboard
+        if keyboard is not None and self.listening(keyboard):
+            key = keyboard.take()
+            if key is not None:
+                self.write(KEY_ADDRESS, key)
+                self.raise_interrupt(keyboard.interrupt)
+
+    def skip_idle(self, loop, limit):
+        """
+        The CPU is in an idle loop of the given length: retire as many
+        instructions of it as the timer allows without running them, at
+        most limit. Returns the number retired.
+        """
+        skipped = self.timer.skip(loop, limit)
+        self.timer.retired(skipped)
+        self.idle_instructions += skipped
+        return skipped
+
+    def waiting_keyboard(self):
+        """The keyboard to wake on while idle, or None."""
+        keyboard = self.keyboard
+        if (keyboard is not None and not keyboard.ended and
+                self.listening(keyboard)):
+            return keyboard
+        return None
+
+    def seconds_until_due(self):
+        """Seconds until the timer is due, or None if there is no timer."""
+        if self.timer is None:
+            return None
+        return self.timer.seconds_until_due()
+
+    def wait(self):
+        """
+        Block until the timer is due, or until a key arrives for a guest
+        listening to the keyboard. With no timer, waits on the keyboard
+        alone, for as long as it takes.
+        """
+        seconds = self.seconds_until_due()
+        keyboard = self.waiting_keyboard()
+        start = time.perf_counter()
+        if keyboard is not None:
+            keyboard.wait(seconds)
+        else:
+            time.sleep(seconds)
+        self.idle_time += time.perf_counter() - start
+
+    async def wait_async(self):
+        """wait(), yielding to the event loop instead of blocking."""
+        # imported here: asyncio alone takes longer to import than the
+        # rest of the emulator
+        import asyncio
+
+        seconds = self.seconds_until_due()
+        keyboard = self.waiting_keyboard()
+        start = time.perf_counter()
+        self.parked = True
+        try:
+            if keyboard is not None:
+                await keyboard.wait_async(seconds)
+            else:
+                await asyncio.sleep(seconds)
+        finally:
+            self.parked = False
+            self.idle_time += time.perf_counter() - start
+
+    def watched(self, handler):
+        """
+        Wrap the handler of an instruction that writes IM or IS so it
+        raises Pending when the write leaves an interrupt to deliver.
+        Only those decode entries pay for the check.
+        """
+        def watched_handler(a, b, next_pc):
+            pc = handler(a, b, next_pc)
+            if self.update_pending():
+                raise Pending(pc)
+            return pc
+        return watched_handler
+
+    def decode(self, pc):
+        """
+        Fetch and decode the instruction at pc, and cache the result.
+        The operand count is the top two bits of the opcode (AABCDDDD).
+        """
+        ram = self.ram
+        command = ram[pc]
+        handler = self.branchtable[command]
+        next_pc = (pc + SIZES[command]) & 0xFF
+        if handler == self.handle_trap:
+            entry = (handler, command, pc, next_pc)
+        else:
+            a = ram[(pc + 1) & 0xFF]
+            if command in REGISTER_WRITERS and (a == IM or a == IS):
+                handler = self.watched(handler)
+            entry = (handler, a, ram[(pc + 2) & 0xFF], next_pc)
+        self.decoded[pc] = entry
+        return entry
+
+    def run(self, max_steps=None, block=True):
+        """
+        Run the CPU from the current pc until it halts, traps or faults, or
+        until max_steps instructions have been retired. All state is kept,
+        so a run that used up its budget can be resumed by calling run()
+        again. With block false, a CPU that would have to wait for an
+        interrupt returns IDLE instead. Returns a RunResult.
+        """
+        try:
+            if self.timer is not None or self.keyboard is not None:
+                result = self.run_devices(max_steps, block)
+            else:
+                result = self.execute(max_steps)
+        finally:
+            self.output.flush()
+        if self.tracer is not None:
+            self.tracer.stopped(result)
+        return result
+
+    async def run_async(self, quantum=1024, max_steps=None):
+        """
+        Run like run(), as a coroutine: execute quantum instructions at a
+        time and yield to the event loop between them. While the guest
+        waits for an interrupt the coroutine waits on its devices without
+        holding the loop. An output sink with a drain() coroutine is
+        drained at every yield. Returns a RunResult.
+        """
+        import asyncio
+
+        drain = getattr(self.output, "drain", None)
+        steps = 0
+
+        while True:
+            n = quantum if max_steps is None else min(quantum, max_steps - steps)
+            result = self.run(n, block=False)
+            steps += result.instructions
+            result.instructions = steps
+            if drain is not None:
+                await drain()
+
+            if result.reason == IDLE:
+                await self.wait_async()
+            elif result.reason != BUDGET or steps == max_steps:
+                return result
+            else:
+                await asyncio.sleep(0)
+
+    def execute(self, max_steps=None):
+        """
+        Run the selected engine's loop, or the tracing or profiling loop.
+        The tracing loop also profiles when both are attached.
+        """
+        if self.tracer is not None:
+            return self.run_traced(max_steps)
+        if self.profile is not None:
+            return self.run_profiled(max_steps)
+        if self.engine == COMPILED:
+            return self.run_compiled(max_steps)
+        elif self.engine == CACHED:
+            return self.run_cached(max_steps)
+        else:
+            return self.run_interpreter(max_steps)
+
+    def run_devices(self, max_steps=None, block=True):
+        """
+        Run with devices attached: execute in chunks that end where the
+        timer may be due, poll the devices and deliver any enabled
+        interrupt between chunks. A chunk that ends in an idle loop skips
+        ahead on the timer or waits for a device rather than spinning; if
+        it would have to wait and block is false, return IDLE. With no
+        timer, only a guest listening to the keyboard waits: one that is
+        not can never be interrupted, and spins as it would without
+        devices.
+        """
+        timer = self.timer
+        steps = 0
+        check = IDLE_CHECK_FIRST
+
+        while True:
+            chunk = check
+            if timer is not None:
+                chunk = min(timer.steps_until_due(), chunk)
+            if max_steps is not None:
+                chunk = min(chunk, max_steps - steps)
+            result = self.execute(chunk)
+            steps += result.instructions
+            if timer is not None:
+                timer.retired(result.instructions)
+            result.instructions = steps
+
+            if result.reason != BUDGET:
+                return result
+            self.poll_devices()
+            pc = self.pc
+            self.pc = self.interrupt(pc)
+            if self.pc != pc:
+                check = IDLE_CHECK_FIRST
+            elif check < IDLE_CHECK_INTERVAL:
+                check *= 2
+            spent = max_steps is not None and steps >= max_steps
+
+            loop = self.idle_loop()
+            if loop:
+                # nothing more is printed until an interrupt arrives
+                self.output.flush()
+                if timer is not None:
+                    skipped = self.skip_idle(loop, sys.maxsize if max_steps is None
+                                             else max_steps - steps)
+                    steps += skipped
+                    if skipped or not timer.seconds_until_due():
+                        loop = 0
+                elif self.waiting_keyboard() is None:
+                    loop = 0
+            # a guest left waiting when the budget runs out still reports
+            # IDLE, so a caller running short slices can park it
+            if spent and (block or not loop):
+                result.pc = self.pc
+                result.opcode = self.ram[self.pc]
+                return result
+            if not loop:
+                continue
+            if not block:
+                result.reason = IDLE
+                result.pc = self.pc
+                result.opcode = self.ram[self.pc]
+                return result
+            self.wait()
+
+    def step(self, n=1):
+        """Execute n instructions (fewer if the CPU stops). Returns a RunResult."""
+        return self.run(n)
+
+    def run_until(self, pc, max_steps=None):
+        """
+        Run until the pc reaches the given address, checked after every
+        instruction, or until the CPU stops or max_steps runs out. Always
+        executes from the decode cache, whatever the engine; with devices,
+        a tracer or a profile attached, one instruction at a time through
+        run()'s own loops, so each of them sees every instruction.
+        Returns a RunResult.
+        """
+        if (self.timer is not None or self.keyboard is not None or
+                self.tracer is not None or self.profile is not None):
+            return self.step_until(pc, max_steps)
+        target = pc
+        pc = self.pc
+        decoded = self.decoded
+        decode = self.decode
+        steps = 0
+        try:
+            while True:
+                try:
+                    for steps in (count(steps) if max_steps is None
+                                  else range(steps, max_steps)):
+                        entry = decoded[pc]
+                        if entry is None:
+                            entry = decode(pc)
+                        handler, a, b, next_pc = entry
+                        pc = handler(a, b, next_pc)
+                        if pc == target:
+                            self.pc = pc
+                            return RunResult(REACHED, pc, self.ram[pc],
+                                             steps + 1)
+                    return self.out_of_steps(pc, max_steps)
+                except Pending as e:
+                    steps += 1
+                    pc = self.interrupt(e.next_pc)
+                    if pc == target:
+                        self.pc = pc
+                        return RunResult(REACHED, pc, self.ram[pc], steps)
+        except (Halt, Trap, IndexError, ZeroDivisionError) as e:
+            return self.stopped(e, pc, steps)
+        finally:
+            self.output.flush()
+
+    def step_until(self, target, max_steps=None):
+        """
+        run_until() for an instrumented CPU: execute one instruction at a
+        time the way run() does, polling devices and delivering interrupts
+        between them.
+        """
+        devices = self.timer is not None or self.keyboard is not None
+        steps = 0
+        result = self.out_of_steps(self.pc, 0)
+        try:
+            while max_steps is None or steps < max_steps:
+                if devices:
+                    result = self.run_devices(1)
                 else:
-                    self.pc += 2
+                    result = self.execute(1)
+                steps += result.instructions
+                result.instructions = steps
+                if result.reason != BUDGET:
+                    break
+                if self.pc == target:
+                    result = RunResult(REACHED, self.pc, self.ram[self.pc],
+                                       steps)
+                    break
+        finally:
+            self.output.flush()
+        if self.tracer is not None:
+            self.tracer.stopped(result)
+        return result
+
+    def stopped(self, e, pc, retired):
+        """
+        Build the RunResult for the exception e that ended a run loop at pc,
+        after retired instructions, and leave self.pc where execution
+        would continue.
+        """
+        if isinstance(e, Halt):
+            self.pc = e.next_pc
+            return RunResult(HALTED, (e.next_pc - 1) & 0xFF, HLT, retired + 1)
+        if isinstance(e, Trap):
+            self.pc = e.address
+            return RunResult(TRAPPED, e.address, e.opcode, retired)
+        self.pc = pc
+        return RunResult(FAULTED, pc, self.ram[pc], retired)
 
-            elif command == JNE:
-                # if equal flag false, jump to the address stored in the given register.
-                if self.flag & 0b00000001 is 0:
-                    self.pc = self.reg[self.ram[self.pc + 1]]
+    def out_of_steps(self, pc, retired):
+        """Build the RunResult for a loop that used up its budget at pc."""
+        self.pc = pc
+        return RunResult(BUDGET, pc, self.ram[pc], retired)
+
+    def run_interpreter(self, max_steps=None):
+        """Fetch, decode and execute one instruction at a time."""
+        pc = self.pc
+        ram = self.ram
+        branchtable = self.branchtable
+        trap = self.handle_trap
+        steps = 0
+        try:
+            for steps in (count() if max_steps is None else range(max_steps)):
+                command = ram[pc]
+                handler = branchtable[command]
+                next_pc = (pc + SIZES[command]) & 0xFF
+                if handler == trap:
+                    pc = handler(command, pc, next_pc)
                 else:
-                    self.pc += 2
+                    a = ram[(pc + 1) & 0xFF]
+                    pc = handler(a, ram[(pc + 2) & 0xFF], next_pc)
+                    if (command in REGISTER_WRITERS and (a == IM or a == IS)
+                            and self.update_pending()):
+                        pc = self.interrupt(pc)
+        except (Halt, Trap, IndexError, ZeroDivisionError) as e:
+            return self.stopped(e, pc, steps)
+        return self.out_of_steps(pc, max_steps)
 
+    def run_cached(self, max_steps=None):
+        """
+        Execute from the fused decode cache, decoding only on a miss. The
+        loop never looks at IM or IS: an instruction that leaves an
+        interrupt pending raises Pending, and it is delivered here.
+
+        A fused entry retires two instructions in one dispatch, so the loop
+        runs half the remaining budget in dispatches at a time and counts
+        the instructions from dispatches_saved afterwards; a last odd
+        instruction runs unfused.
+        """
+        pc = self.pc
+        fused = self.fused
+        fuse = self.fuse
+        budget = sys.maxsize if max_steps is None else max_steps
+        saved = self.dispatches_saved
+        # dispatches made
+        steps = 0
+        while True:
+            try:
+                while True:
+                    n = (budget - steps - self.dispatches_saved + saved) // 2
+                    if n == 0:
+                        break
+                    for steps in range(steps, steps + n):
+                        entry = fused[pc]
+                        if entry is None:
+                            entry = fuse(pc)
+                        handler, a, b, next_pc = entry
+                        pc = handler(a, b, next_pc)
+                    steps += 1
+                break
+            except Pending as e:
+                steps += 1
+                pc = self.interrupt(e.next_pc)
+            except (Halt, Trap, IndexError, ZeroDivisionError) as e:
+                return self.stopped(e, pc,
+                                    steps + self.dispatches_saved - saved)
+
+        steps += self.dispatches_saved - saved
+        self.pc = pc
+        if steps == budget:
+            return self.out_of_steps(pc, budget)
+        result = self.run_interpreter(budget - steps)
+        result.instructions += steps
+        return result
+
+    def run_profiled(self, max_steps=None):
+        """
+        run_cached() with every retired instruction counted into
+        self.profile: by opcode and address, CALL targets, and conditional
+        jumps taken or not taken. Whatever the engine, a profiled run
+        executes from the decode cache.
+        """
+        profile = self.profile
+        opcodes = profile.opcodes
+        addresses = profile.addresses
+        calls = profile.calls
+        taken = profile.taken
+        not_taken = profile.not_taken
+        pc = self.pc
+        ram = self.ram
+        decoded = self.decoded
+        decode = self.decode
+        steps = 0
+        while True:
+            try:
+                for steps in (count(steps) if max_steps is None
+                              else range(steps, max_steps)):
+                    entry = decoded[pc]
+                    if entry is None:
+                        entry = decode(pc)
+                    handler, a, b, next_pc = entry
+                    new_pc = handler(a, b, next_pc)
+                    opcode = ram[pc]
+                    opcodes[opcode] += 1
+                    addresses[pc] += 1
+                    if opcode == CALL:
+                        calls[new_pc] += 1
+                    elif opcode in CONDITIONAL_JUMPS:
+                        # jumps leave FL alone, so it still shows the outcome
+                        bits, when_set = CONDITIONAL_JUMPS[opcode]
+                        if (self.flag & bits != 0) == when_set:
+                            taken[pc] += 1
+                        else:
+                            not_taken[pc] += 1
+                    pc = new_pc
+                return self.out_of_steps(pc, max_steps)
+            except (Pending, Halt) as e:
+                # both retire the instruction that raised them
+                opcodes[ram[pc]] += 1
+                addresses[pc] += 1
+                if isinstance(e, Halt):
+                    return self.stopped(e, pc, steps)
+                steps += 1
+                pc = self.interrupt(e.next_pc)
+            except (Trap, IndexError, ZeroDivisionError) as e:
+                return self.stopped(e, pc, steps)
+
+    def count_instruction(self, pc, new_pc=None):
+        """
+        Count the instruction at pc into self.profile the way
+        run_profiled() does. new_pc is where it went, or None if it raised
+        Pending or Halt.
+        """
+        profile = self.profile
+        opcode = self.ram[pc]
+        profile.opcodes[opcode] += 1
+        profile.addresses[pc] += 1
+        if new_pc is None:
+            return
+        if opcode == CALL:
+            profile.calls[new_pc] += 1
+        elif opcode in CONDITIONAL_JUMPS:
+            bits, when_set = CONDITIONAL_JUMPS[opcode]
+            if (self.flag & bits != 0) == when_set:
+                profile.taken[pc] += 1
             else:
-                print(f"Unknown instruction: {command:>08b}")
-                sys.exit(1)  
\ No newline at end of file
+                profile.not_taken[pc] += 1
+
+    def run_traced(self, max_steps=None):
+        """
+        run_cached() writing a record of each instruction into
+        self.tracer's ring buffer before running it. Whatever the engine, a
+        traced run executes from the decode cache. With a profile attached
+        as well, each instruction is also counted into it.
+        """
+        tracer = self.tracer
+        profile = self.profile
+        buffer = tracer.buffer
+        size = tracer.size
+        pack_into = tracer.record.pack_into
+        width = tracer.record.size
+        slot = tracer.next
+        pc = self.pc
+        reg = self.reg
+        ram = self.ram
+        decoded = self.decoded
+        decode = self.decode
+        steps = 0
+        try:
+            while True:
+                try:
+                    for steps in (count(steps) if max_steps is None
+                                  else range(steps, max_steps)):
+                        pack_into(buffer, slot * width, pc, ram[pc],
+                                  ram[(pc + 1) & 0xFF], ram[(pc + 2) & 0xFF],
+                                  self.flag, *reg)
+                        slot += 1
+                        if slot == size:
+                            slot = 0
+                            tracer.full = True
+                        entry = decoded[pc]
+                        if entry is None:
+                            entry = decode(pc)
+                        handler, a, b, next_pc = entry
+                        new_pc = handler(a, b, next_pc)
+                        if profile is not None:
+                            self.count_instruction(pc, new_pc)
+                        pc = new_pc
+                    return self.out_of_steps(pc, max_steps)
+                except Pending as e:
+                    if profile is not None:
+                        self.count_instruction(pc)
+                    steps += 1
+                    pc = self.interrupt(e.next_pc)
+                except Halt as e:
+                    if profile is not None:
+                        self.count_instruction(pc)
+                    return self.stopped(e, pc, steps)
+                except (Trap, IndexError, ZeroDivisionError) as e:
+                    return self.stopped(e, pc, steps)
+        finally:
+            tracer.next = slot
+
+    def run_compiled(self, max_steps=None):
+        """
+        Execute one compiled basic block per iteration. Instructions are
+        counted, and the budget checked, a block at a time; when the next
+        block would overrun the budget the rest is single-stepped from the
+        decode cache. With an ahead-of-time translation installed, an
+        address it has no block for runs as a one-instruction block from
+        the decode cache instead of being compiled.
+        """
+        pc = self.pc
+        blocks = self.blocks
+        if self.translated:
+            compile_block = self.decoded_block
+        else:
+            compile_block = self.compile_block
+        budget = sys.maxsize if max_steps is None else max_steps
+        steps = 0
+        block = None
+        self.overcount = 0
+        while True:
+            try:
+                while True:
+                    block = blocks[pc]
+                    if block is None:
+                        block = compile_block(pc)
+                    if steps + block.length > budget:
+                        steps -= self.overcount
+                        self.overcount = 0
+                        if steps + block.length > budget:
+                            break
+                    pc = block()
+                    steps += block.length
+                break
+            except Pending as e:
+                # the block bailed out after the instruction that raised it
+                steps += block.length
+                pc = self.interrupt(e.next_pc)
+            except (Halt, Trap) as e:
+                # HLT and traps always end their block
+                return self.stopped(e, pc, steps + block.length - 1 -
+                                    self.overcount)
+            except (IndexError, ZeroDivisionError) as e:
+                # somewhere inside the block starting at pc
+                return self.stopped(e, pc, steps - self.overcount)
+
+        self.pc = pc
+        result = self.run_cached(budget - steps)
+        result.instructions += steps
+        return result
+
+
+for _name, _code, _form in INSTRUCTIONS:
+    # every instruction in the ISA table needs a handler, unless it is
+    # listed as unimplemented
+    assert (hasattr(CPU, f"handle_{_name.lower()}") or
+            _name in UNIMPLEMENTED), _name
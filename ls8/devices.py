@@ -0,0 +1,308 @@
+"""Interrupt sources for the LS-8."""
+
+import os
+import selectors
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import termios
+    import tty
+except ImportError:
+    # not a POSIX system: terminals stay in line mode
+    termios = None
+
+# Interrupt numbers
+TIMER_INTERRUPT = 0
+KEYBOARD_INTERRUPT = 1
+
+
+class WallTimer:
+    """
+    I0 timer on host time: fires once every period seconds. The CPU runs
+    poll_interval instructions between looks at the clock, so a tick can be
+    late by up to that many instructions.
+    """
+
+    interrupt = TIMER_INTERRUPT
+
+    def __init__(self, period=1.0, poll_interval=1024):
+        self.period = period
+        self.poll_interval = poll_interval
+        self.deadline = time.monotonic() + period
+
+    def reset(self):
+        self.deadline = time.monotonic() + self.period
+
+    def steps_until_due(self):
+        """Instructions the CPU may run before asking due() again."""
+        return self.poll_interval
+
+    def retired(self, n):
+        """The CPU retired n more instructions."""
+        pass
+
+    def skip(self, loop, limit):
+        """
+        Instructions an idle loop of loop instructions may retire without
+        running. Host time has no instruction count, so none: the CPU waits
+        seconds_until_due() instead.
+        """
+        return 0
+
+    def seconds_until_due(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def due(self):
+        """True if a tick is due. Rearms the timer for the next one."""
+        now = time.monotonic()
+        if now < self.deadline:
+            return False
+        # skip ticks we slept through rather than firing a burst of them
+        self.deadline += self.period * (1 + int((now - self.deadline) //
+                                                self.period))
+        return True
+
+
+class VirtualTimer:
+    """
+    I0 timer on virtual time: one "second" is a fixed number of retired
+    instructions. Runs as fast as the host allows and fires at the same
+    instruction every run, so interrupt-driven programs are deterministic.
+    """
+
+    interrupt = TIMER_INTERRUPT
+
+    def __init__(self, instructions=100000):
+        self.instructions = instructions
+        self.remaining = instructions
+
+    def reset(self):
+        self.remaining = self.instructions
+
+    def steps_until_due(self):
+        return self.remaining
+
+    def retired(self, n):
+        self.remaining -= n
+
+    def skip(self, loop, limit):
+        """
+        Skip an idle loop forward to the next tick in whole trips round it,
+        so the tick lands on the same instruction as without skipping.
+        """
+        n = min(self.remaining, limit)
+        return n - n % loop
+
+    def seconds_until_due(self):
+        # virtual time never waits on the host clock
+        return 0.0
+
+    def due(self):
+        if self.remaining > 0:
+            return False
+        self.remaining += self.instructions
+        return True
+
+
+class Keyboard:
+    """
+    I1 source: keystrokes read from a file (stdin by default). A reader
+    thread waits on the file descriptor with a selector and queues bytes as
+    they arrive, so the CPU never makes a system call to take a key.
+    Terminals are switched to one-key-at-a-time input while it runs.
+
+    With replay set, the input is a script rather than a live keyboard:
+    whenever the guest can take a key, the next one is waited for, so keys
+    piped from a file land on the same instruction every run.
+    """
+
+    interrupt = KEYBOARD_INTERRUPT
+
+    def __init__(self, file=None, replay=False):
+        self.file = file if file is not None else sys.stdin
+        self.replay = replay
+        # bytes read but not taken yet; deque appends and pops are atomic,
+        # so the reader thread and the CPU share it without a lock
+        self.keys = deque()
+        # set when bytes arrive or the input ends
+        self.arrived = threading.Event()
+        # True once the reader has seen the end of the input
+        self.ended = False
+        self.thread = None
+        self.wakeup = None
+        self.terminal_mode = None
+
+    def start(self):
+        """Start the reader thread. Done on first use."""
+        fd = self.file.fileno()
+        if termios is not None and os.isatty(fd):
+            self.terminal_mode = termios.tcgetattr(fd)
+            tty.setcbreak(fd)
+        # written to by close() to stop the reader
+        self.wakeup = os.pipe()
+        self.thread = threading.Thread(target=self.reader, args=(fd,),
+                                       daemon=True)
+        self.thread.start()
+
+    def reader(self, fd):
+        # epoll refuses regular files, poll and select take anything
+        if hasattr(selectors, "PollSelector"):
+            selector = selectors.PollSelector()
+        else:
+            selector = selectors.SelectSelector()
+        selector.register(fd, selectors.EVENT_READ)
+        selector.register(self.wakeup[0], selectors.EVENT_READ)
+        try:
+            while True:
+                for key, events in selector.select():
+                    if key.fd != fd:
+                        return
+                    data = os.read(fd, 4096)
+                    if not data:
+                        return
+                    self.keys.extend(data)
+                    self.arrived.set()
+        finally:
+            selector.close()
+            self.ended = True
+            self.arrived.set()
+
+    def take(self):
+        """
+        Return the next key byte, or None if there is none. In replay mode,
+        waits for one unless the input has ended.
+        """
+        if self.thread is None:
+            self.start()
+        if self.replay:
+            while not self.keys and not self.ended:
+                self.arrived.clear()
+                if self.keys or self.ended:
+                    break
+                self.arrived.wait()
+        if self.keys:
+            return self.keys.popleft()
+        return None
+
+    def wait(self, seconds):
+        """
+        Sleep for up to seconds, returning early if a key arrives. None
+        means no limit.
+        """
+        if self.thread is None:
+            self.start()
+        self.arrived.clear()
+        if self.keys:
+            return
+        if self.ended:
+            if seconds is not None:
+                time.sleep(seconds)
+        else:
+            self.arrived.wait(seconds)
+
+    async def wait_async(self, seconds):
+        """wait() on an executor thread, for CPUs on an event loop."""
+        # asyncio is only imported by CPUs that run on an event loop, see
+        # CPU.wait_async
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self.wait,
+                                                         seconds)
+
+    def close(self):
+        """Stop the reader thread and restore the terminal."""
+        if self.thread is None:
+            return
+        os.write(self.wakeup[1], b"x")
+        self.thread.join()
+        for fd in self.wakeup:
+            os.close(fd)
+        self.thread = None
+        if self.terminal_mode is not None:
+            termios.tcsetattr(self.file.fileno(), termios.TCSADRAIN,
+                              self.terminal_mode)
+            self.terminal_mode = None
+
+
+class AsyncKeyboard:
+    """
+    I1 source for CPUs running on an asyncio event loop: the loop watches
+    the file descriptor (stdin by default) and queues bytes as they arrive,
+    so one loop serves the keyboards of many machines without a thread
+    each. Works with pipes, sockets and terminals; the loop cannot watch
+    regular files, use Keyboard for those.
+    """
+
+    interrupt = KEYBOARD_INTERRUPT
+
+    def __init__(self, file=None):
+        self.file = file if file is not None else sys.stdin
+        self.keys = deque()
+        # set when bytes arrive or the input ends, made on first use
+        self.arrived = None
+        self.ended = False
+        self.loop = None
+
+    def start(self):
+        """Start watching the file. Done on first use, inside the loop."""
+        import asyncio
+
+        self.loop = asyncio.get_running_loop()
+        self.arrived = asyncio.Event()
+        fd = self.file.fileno()
+        os.set_blocking(fd, False)
+        self.loop.add_reader(fd, self.readable, fd)
+
+    def readable(self, fd):
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        if data:
+            self.keys.extend(data)
+        else:
+            self.ended = True
+            self.loop.remove_reader(fd)
+        self.arrived.set()
+
+    def take(self):
+        """Return the next key byte, or None if there is none."""
+        if self.loop is None:
+            self.start()
+        if self.keys:
+            return self.keys.popleft()
+        return None
+
+    async def wait_async(self, seconds):
+        """
+        Sleep for up to seconds, returning early if a key arrives. None
+        means no limit.
+        """
+        import asyncio
+
+        if self.loop is None:
+            self.start()
+        self.arrived.clear()
+        if self.keys:
+            return
+        if self.ended:
+            if seconds is not None:
+                await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(self.arrived.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def close(self):
+        """Stop watching the file."""
+        if self.loop is None:
+            return
+        fd = self.file.fileno()
+        if not self.ended:
+            self.loop.remove_reader(fd)
+        os.set_blocking(fd, True)
+        self.loop = None
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Disassembler: lists an .ls8 or .ls8b program as assembler source, one
+instruction per line with its address and bytes in a comment. Labels come
+from the symbol table of .ls8b images.
+
+Usage: disasm.py program
+"""
+
+import sys
+
+from cpu import CPU
+from image import is_image, read_symbols
+from isa import disassemble_code
+
+
+def listing(code, symbols=None):
+    """Return the assembler listing of code as a list of lines."""
+    labels = {}
+    for name, address in (symbols or {}).items():
+        labels.setdefault(address, name)
+
+    lines = []
+    for address, size, text in disassemble_code(code, labels):
+        if address in labels:
+            lines.append(f"{labels[address]}:")
+        raw = " ".join(f"{byte:02X}" for byte in code[address:address + size])
+        lines.append(f"    {text:<20} ; {address:02X}: {raw}")
+    return lines
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("usage: disasm.py program", file=sys.stderr)
+        return 1
+
+    cpu = CPU()
+    try:
+        length = cpu.load(argv[1])
+    except FileNotFoundError:
+        print("File not found", file=sys.stderr)
+        return 2
+    symbols = read_symbols(argv[1]) if is_image(argv[1]) else None
+
+    for line in listing(cpu.ram[:length], symbols):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+Fleet runner: executes many .ls8 programs across a pool of warm worker
+processes and streams one JSON result per job.
+
+Usage: fleet.py [options] (directory | manifest.jsonl)
+
+A directory runs every .ls8/.ls8b file in it. A manifest has one JSON job
+per line:
+
+    {"id": "mult", "program": "examples/mult.ls8", "max_steps": 1000,
+     "timeout": 0.5}
+
+id defaults to the program path; max_steps and timeout default to the
+command line values. An optional "input" file is replayed as keystrokes,
+one per keyboard interrupt the program takes.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cpu import *
+from devices import Keyboard, VirtualTimer
+from sinks import MemorySink
+
+# How often, in instructions, a worker looks at the clock
+TIMEOUT_CHECK_INTERVAL = 4096
+
+# Job status values, on top of the cpu.py HALTED/TRAPPED/FAULTED reasons
+STEP_LIMIT = "step_limit"  # ran out of its step budget
+TIMEOUT    = "timeout"     # ran out of wall time
+ERROR      = "error"       # could not load the program
+
+# Process exit status ls8.py would give for each outcome
+EXIT_CODES = {HALTED: 0, TRAPPED: 1, FAULTED: 1, ERROR: 2}
+
+# One CPU per worker process, reused for every job it runs
+worker_cpu = None
+
+
+def init_worker(engine, tick):
+    global worker_cpu
+    timer = VirtualTimer(tick) if tick else None
+    worker_cpu = CPU(engine, timer=timer)
+
+
+def execute(cpu, max_steps, timeout):
+    """
+    Run the loaded program until it stops, or until the step budget or
+    the deadline runs out. The CPU runs TIMEOUT_CHECK_INTERVAL instructions
+    at a time between looks at the clock. Returns a RunResult.
+    """
+    deadline = time.perf_counter() + timeout
+    steps = 0
+
+    while True:
+        chunk = min(max_steps - steps, TIMEOUT_CHECK_INTERVAL)
+        result = cpu.run(chunk)
+        steps += result.instructions
+        result.instructions = steps
+        if result.reason != BUDGET:
+            return result
+        if steps >= max_steps:
+            result.reason = STEP_LIMIT
+            return result
+        if time.perf_counter() > deadline:
+            result.reason = TIMEOUT
+            return result
+
+
+def run_job(job):
+    """Run one job on this worker's CPU and return its result record."""
+    cpu = worker_cpu
+    cpu.reset()
+    out = MemorySink()
+    cpu.output = out
+    start = time.perf_counter()
+
+    try:
+        cpu.load(job["program"])
+        if "input" in job:
+            cpu.keyboard = Keyboard(open(job["input"], "rb"), replay=True)
+    except (OSError, ValueError) as e:
+        result = RunResult(ERROR, 0, 0, 0)
+        out.write(f"{e}\n")
+    else:
+        result = execute(cpu, job["max_steps"], job["timeout"])
+    finally:
+        if cpu.keyboard is not None:
+            cpu.keyboard.close()
+            cpu.keyboard.file.close()
+            cpu.keyboard = None
+
+    return record(job, result, out.getvalue(), time.perf_counter() - start)
+
+
+def record(job, result, stdout, wall_time):
+    """The JSON result record of a job."""
+    return {
+        "id": job["id"],
+        "program": job["program"],
+        "status": result.reason,
+        "exit_code": EXIT_CODES.get(result.reason),
+        "pc": result.pc,
+        "opcode": result.opcode,
+        "stdout": stdout,
+        "instructions": result.instructions,
+        "wall_time": wall_time,
+    }
+
+
+def read_jobs(source, max_steps, timeout):
+    """Build the job list from a directory or a JSONL manifest."""
+    jobs = []
+
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".ls8") or name.endswith(".ls8b"):
+                jobs.append({"program": os.path.join(source, name)})
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                line = line.strip()
+                if line == '':
+                    continue
+                job = json.loads(line)
+                job["program"] = os.path.join(base, job["program"])
+                if "input" in job:
+                    job["input"] = os.path.join(base, job["input"])
+                jobs.append(job)
+
+    for job in jobs:
+        job.setdefault("id", job["program"])
+        job.setdefault("max_steps", max_steps)
+        job.setdefault("timeout", timeout)
+
+    return jobs
+
+
+def run_fleet(jobs, outputfile, workers=None, engine=CACHED, tick=None):
+    """
+    Run jobs on a process pool, writing each result as it finishes. With a
+    tick, every CPU gets a virtual-time timer firing each tick instructions.
+    A job that fails in a way run_job() does not expect gets an ERROR
+    record, and the rest of the fleet carries on.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(engine, tick)) as pool:
+        futures = {pool.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = record(futures[future], RunResult(ERROR, 0, 0, 0),
+                                f"{type(e).__name__}: {e}\n", 0.0)
+            outputfile.write(json.dumps(result) + "\n")
+            outputfile.flush()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run many LS-8 programs.")
+    parser.add_argument("source", help="directory of programs or JSONL manifest")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--max-steps", type=int, default=10_000_000,
+                        help="default per-job instruction budget")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="default per-job wall time limit in seconds")
+    parser.add_argument("--engine", choices=ENGINES, default=CACHED)
+    parser.add_argument("--tick", type=int, default=None, metavar="N",
+                        help="fire the timer interrupt every N instructions")
+    args = parser.parse_args(argv[1:])
+
+    jobs = read_jobs(args.source, args.max_steps, args.timeout)
+    run_fleet(jobs, sys.stdout, args.workers, args.engine, args.tick)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,145 @@
+"""
+Superinstructions: common two-instruction sequences decoded as one entry of
+the fused decode cache, so the cached engine runs them with one dispatch.
+
+    LDI Rx,label ; JMP/CALL/conditional jump Rx
+    CMP Ra,Rb    ; conditional jump Rc
+    PUSH Ra      ; PUSH Rb
+    POP Ra       ; POP Rb
+
+Entries are cached by the address of the first instruction, so a jump to
+the second one finds its own, unfused entry there.
+"""
+
+from operator import eq, ge, gt, le, lt, ne
+
+from cpu import *
+
+# Conditional jump -> the comparison of the CMP operands it takes
+TESTS = {JEQ: eq, JNE: ne, JGT: gt, JLT: lt, JLE: le, JGE: ge}
+
+# Registers a fused pair may write: not IM or IS, whose writes have to be
+# watched for interrupts, and not SP, which the pushes and pops move
+WRITABLE = range(IM)
+
+
+def fuse(cpu, pc):
+    """
+    Return the fused decode entry for pc: a superinstruction if the
+    instructions at pc and after it make one, otherwise the plain decode
+    entry. Cache it in cpu.fused.
+    """
+    entry = cpu.decoded[pc]
+    if entry is None:
+        entry = cpu.decode(pc)
+    ram = cpu.ram
+    first = ram[pc]
+    middle = entry[3]
+    second = ram[middle]
+    if second in FUSERS.get(first, ()):
+        a, b = entry[1], entry[2]
+        c = ram[(middle + 1) & 0xFF]
+        end = (middle + SIZES[second]) & 0xFF
+        handler = FUSERS[first][second](cpu, pc, a, b, c, middle, second)
+        if handler is not None:
+            entry = (handler, a, b, end)
+    cpu.fused[pc] = entry
+    return entry
+
+
+def fuse_ldi_jump(cpu, pc, a, label, c, middle, second):
+    # the jump must go through the register LDI just loaded
+    if a != c or a not in WRITABLE:
+        return None
+    reg = cpu.reg
+
+    if second == JMP:
+        def ldi_jmp(a, label, end):
+            reg[a] = label
+            cpu.dispatches_saved += 1
+            return label
+        return ldi_jmp
+
+    if second == CALL:
+        write = cpu.write
+
+        def ldi_call(a, label, end):
+            reg[a] = label
+            sp = reg[SP] = (reg[SP] - 1) & 0xFF
+            write(sp, end)
+            cpu.dispatches_saved += 1
+            return label
+        return ldi_call
+
+    test = TESTS[second]
+
+    def ldi_branch(a, label, end):
+        reg[a] = label
+        cpu.dispatches_saved += 1
+        if test(cpu.cmp_a, cpu.cmp_b):
+            return label
+        return end
+    return ldi_branch
+
+
+def fuse_cmp_branch(cpu, pc, a, b, c, middle, second):
+    if a > 7 or b > 7 or c > 7:
+        return None
+    reg = cpu.reg
+    test = TESTS[second]
+
+    def cmp_branch(a, b, end):
+        x = cpu.cmp_a = reg[a]
+        y = cpu.cmp_b = reg[b]
+        cpu.dispatches_saved += 1
+        if test(x, y):
+            return reg[c]
+        return end
+    return cmp_branch
+
+
+def fuse_push_push(cpu, pc, a, b, c, middle, second):
+    if a > 7 or c > 7:
+        return None
+    reg = cpu.reg
+    write = cpu.write
+    fused = cpu.fused
+
+    def push_push(a, b, end):
+        sp = reg[SP] = (reg[SP] - 1) & 0xFF
+        write(sp, reg[a])
+        if fused[pc] is None:
+            # the push landed on this pair: fetch the second one afresh
+            return middle
+        sp = reg[SP] = (sp - 1) & 0xFF
+        write(sp, reg[c])
+        cpu.dispatches_saved += 1
+        return end
+    return push_push
+
+
+def fuse_pop_pop(cpu, pc, a, b, c, middle, second):
+    if a not in WRITABLE or c not in WRITABLE:
+        return None
+    reg = cpu.reg
+    ram = cpu.ram
+
+    def pop_pop(a, b, end):
+        sp = reg[SP]
+        reg[a] = ram[sp]
+        reg[c] = ram[(sp + 1) & 0xFF]
+        reg[SP] = (sp + 2) & 0xFF
+        cpu.dispatches_saved += 1
+        return end
+    return pop_pop
+
+
+# First opcode -> second opcode -> function building the fused handler,
+# or returning None when the operands rule the pair out
+FUSERS = {
+    LDI: {JMP: fuse_ldi_jump, CALL: fuse_ldi_jump,
+          **{jump: fuse_ldi_jump for jump in TESTS}},
+    CMP: {jump: fuse_cmp_branch for jump in TESTS},
+    PUSH: {PUSH: fuse_push_push},
+    POP: {POP: fuse_pop_pop},
+}
@@ -0,0 +1,112 @@
+"""Binary .ls8b program images."""
+
+import struct
+
+# Image layout, all integers little-endian:
+#
+#   magic    4 bytes  b"LS8B"
+#   version  1 byte
+#   flags    1 byte   HAS_SYMBOLS
+#   length   2 bytes  number of code bytes, at most 256
+#   code     length bytes, loaded at address 0
+#
+# If HAS_SYMBOLS is set the code is followed by the symbol table:
+#
+#   count    2 bytes
+#   count entries of: name length (1 byte), name (ASCII), address (1 byte)
+
+MAGIC = b"LS8B"
+VERSION = 1
+
+HAS_SYMBOLS = 0b00000001
+
+HEADER = struct.Struct("<4sBBH")
+
+
+class Image:
+    """
+    A program in memory: its code bytes, loaded at address 0, and its
+    {name: address} symbol table.
+    """
+
+    def __init__(self, code, symbols=None):
+        if len(code) > 256:
+            raise ValueError(f"program is {len(code)} bytes, RAM is 256")
+        self.code = bytes(code)
+        self.symbols = symbols if symbols is not None else {}
+
+    def __repr__(self):
+        return f"Image({len(self.code)} bytes, {len(self.symbols)} symbols)"
+
+
+def is_image(filepath):
+    """True if the file starts with the .ls8b magic."""
+    with open(filepath, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_image(f, code, symbols=None):
+    """Write code bytes and an optional {name: address} table to f."""
+    if len(code) > 256:
+        raise ValueError(f"program is {len(code)} bytes, RAM is 256")
+
+    flags = HAS_SYMBOLS if symbols else 0
+    f.write(HEADER.pack(MAGIC, VERSION, flags, len(code)))
+    f.write(bytes(code))
+
+    if symbols:
+        f.write(struct.pack("<H", len(symbols)))
+        for name, address in symbols.items():
+            encoded = name.encode("ascii")
+            f.write(struct.pack("<B", len(encoded)))
+            f.write(encoded)
+            f.write(struct.pack("<B", address))
+
+
+def read_header(f):
+    """Read and check the header. Returns (flags, length)."""
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError("truncated .ls8b header")
+
+    magic, version, flags, length = HEADER.unpack(header)
+
+    if magic != MAGIC:
+        raise ValueError("not an .ls8b image")
+    if version != VERSION:
+        raise ValueError(f"unsupported .ls8b version {version}")
+    if length > 256:
+        raise ValueError(f"program is {length} bytes, RAM is 256")
+
+    return flags, length
+
+
+def load_image(filepath, ram):
+    """
+    Read the code of an image straight into ram (any writable buffer) with
+    a single readinto. Returns the number of bytes loaded.
+    """
+    with open(filepath, "rb") as f:
+        flags, length = read_header(f)
+        if f.readinto(memoryview(ram)[:length]) != length:
+            raise ValueError("truncated .ls8b code")
+    return length
+
+
+def read_symbols(filepath):
+    """Return the {name: address} table of an image, empty if it has none."""
+    symbols = {}
+
+    with open(filepath, "rb") as f:
+        flags, length = read_header(f)
+        if not flags & HAS_SYMBOLS:
+            return symbols
+
+        f.seek(length, 1)
+        count, = struct.unpack("<H", f.read(2))
+        for _ in range(count):
+            size = f.read(1)[0]
+            name = f.read(size).decode("ascii")
+            symbols[name] = f.read(1)[0]
+
+    return symbols
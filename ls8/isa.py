@@ -0,0 +1,120 @@
+"""
+The LS-8 instruction set: one table, from which the opcode constants, the
+CPU's decode table, the assembler's opcode map and the disassembler are
+all built.
+
+Opcode bytes are laid out AABCDDDD: AA is the number of operands, B is set
+for ALU instructions, C for instructions that set the pc themselves, and
+DDDD tells instructions of the same kind apart.
+"""
+
+# Operand forms: "" none, "r" one register, "rr" two registers, "ri" a
+# register and an immediate (or a label)
+INSTRUCTIONS = [
+    # mnemonic  opcode      form
+    ("NOP",  0b00000000, ""),
+    ("HLT",  0b00000001, ""),
+    ("RET",  0b00010001, ""),
+    ("IRET", 0b00010011, ""),
+    ("PUSH", 0b01000101, "r"),
+    ("POP",  0b01000110, "r"),
+    ("PRN",  0b01000111, "r"),
+    ("PRA",  0b01001000, "r"),
+    ("CALL", 0b01010000, "r"),
+    ("INT",  0b01010010, "r"),
+    ("JMP",  0b01010100, "r"),
+    ("JEQ",  0b01010101, "r"),
+    ("JNE",  0b01010110, "r"),
+    ("JGT",  0b01010111, "r"),
+    ("JLT",  0b01011000, "r"),
+    ("JLE",  0b01011001, "r"),
+    ("JGE",  0b01011010, "r"),
+    ("INC",  0b01100101, "r"),
+    ("DEC",  0b01100110, "r"),
+    ("NOT",  0b01101001, "r"),
+    ("LDI",  0b10000010, "ri"),
+    ("LD",   0b10000011, "rr"),
+    ("ST",   0b10000100, "rr"),
+    ("ADD",  0b10100000, "rr"),
+    ("SUB",  0b10100001, "rr"),
+    ("MUL",  0b10100010, "rr"),
+    ("DIV",  0b10100011, "rr"),
+    ("MOD",  0b10100100, "rr"),
+    ("CMP",  0b10100111, "rr"),
+    ("AND",  0b10101000, "rr"),
+    ("OR",   0b10101010, "rr"),
+    ("XOR",  0b10101011, "rr"),
+    ("SHL",  0b10101100, "rr"),
+    ("SHR",  0b10101101, "rr"),
+]
+
+# HLT = 0b00000001 and so on, one constant per mnemonic
+globals().update((name, code) for name, code, form in INSTRUCTIONS)
+
+# opcode -> mnemonic
+MNEMONICS = {code: name for name, code, form in INSTRUCTIONS}
+
+# opcode -> operand form
+FORMS = {code: form for name, code, form in INSTRUCTIONS}
+
+
+class Opcode:
+    """One entry of the decode table: what the bits of an opcode byte say."""
+
+    __slots__ = ("code", "mnemonic", "operands", "alu", "sets_pc", "size")
+
+    def __init__(self, code):
+        self.code = code
+        # None for bytes that are not instructions
+        self.mnemonic = MNEMONICS.get(code)
+        self.operands = code >> 6
+        self.alu = bool(code & 0b00100000)
+        self.sets_pc = bool(code & 0b00010000)
+        # bytes from this instruction to the next
+        self.size = self.operands + 1
+
+    def __repr__(self):
+        return f"Opcode({self.code:#010b}, {self.mnemonic})"
+
+
+# opcode byte -> Opcode, for all 256 bytes
+DECODE_TABLE = [Opcode(code) for code in range(256)]
+
+# opcode byte -> instruction size, the pc advance of an instruction that
+# does not jump
+SIZES = [entry.size for entry in DECODE_TABLE]
+
+for _name, _code, _form in INSTRUCTIONS:
+    # the form must agree with the operand count the opcode encodes
+    assert len(_form) == _code >> 6, _name
+
+
+def disassemble(opcode, a, b, labels=None):
+    """Assembler text for one instruction, naming addresses from labels."""
+    name = MNEMONICS.get(opcode)
+    if name is None:
+        return f"DB 0x{opcode:02X}"
+    form = FORMS[opcode]
+    if form == "ri":
+        value = labels.get(b, b) if labels else b
+        return f"{name} R{a},{value}"
+    if form == "":
+        return name
+    if form == "r":
+        return f"{name} R{a}"
+    return f"{name} R{a},R{b}"
+
+
+def disassemble_code(code, labels=None):
+    """
+    Yield (address, size, text) for each instruction in a sweep through
+    code from address 0. Bytes that are not instructions come out as DB.
+    """
+    address = 0
+    while address < len(code):
+        opcode = code[address]
+        size = SIZES[opcode] if opcode in MNEMONICS else 1
+        operands = bytes(code[address + 1:address + size]) + bytes(2)
+        yield address, size, disassemble(opcode, operands[0], operands[1],
+                                         labels)
+        address += size
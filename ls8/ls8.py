@@ -2,16 +2,78 @@
 
 """Main."""
 
+import argparse
 import sys
+from aot import install, load_translation
 from cpu import *
+from devices import Keyboard, VirtualTimer, WallTimer
+from image import is_image, read_symbols
+from profiler import Profile
+from tracer import Tracer
 
-if len(sys.argv) != 2:
-    print("usage: file.py filename")
-    sys.exit(1)
+parser = argparse.ArgumentParser(usage="ls8.py [options] filename")
+parser.add_argument("filename")
+parser.add_argument("--engine", choices=ENGINES, default=None,
+                    help="execution engine (default: the program's cached "
+                         "translation from aot.py if there is one, else "
+                         "cached)")
+parser.add_argument("--headless", action="store_true",
+                    help="virtual time: fire the timer every --tick "
+                         "instructions instead of every second, and replay "
+                         "stdin as keystrokes, one per keyboard interrupt "
+                         "the program can take")
+parser.add_argument("--tick", type=int, metavar="N", default=100000,
+                    help="instructions per timer tick with --headless "
+                         "(default: 100000)")
+parser.add_argument("--profile", metavar="FILE", default=None,
+                    help="count executions, write them to FILE as JSON and "
+                         "print an address heatmap to stderr")
+parser.add_argument("--trace", type=int, metavar="N", default=None,
+                    help="keep the last N instructions and print them to "
+                         "stderr when the program halts or fails")
+args = parser.parse_args()
+
+if args.headless:
+    timer = VirtualTimer(args.tick)
+else:
+    timer = WallTimer()
+
+keyboard = Keyboard(sys.stdin, replay=args.headless)
+
+cpu = CPU(args.engine or CACHED, timer=timer, keyboard=keyboard)
+if args.profile is not None:
+    cpu.profile = Profile()
 
-filename = sys.argv[1]
+try:
+    cpu.load(args.filename)
+except FileNotFoundError:
+    print("File not found")
+    sys.exit(2)
+except ValueError as e:
+    print(f"{args.filename}: {e}")
+    sys.exit(2)
 
-cpu = CPU()
+if args.engine is None:
+    translation = load_translation(cpu.ram)
+    if translation is not None:
+        install(cpu, translation)
 
-cpu.load(filename)
-cpu.run()
\ No newline at end of file
+if args.trace is not None:
+    symbols = read_symbols(args.filename) if is_image(args.filename) else None
+    cpu.tracer = Tracer(args.trace, symbols=symbols)
+
+try:
+    result = cpu.run()
+finally:
+    keyboard.close()
+    if cpu.profile is not None:
+        with open(args.profile, "w") as f:
+            cpu.profile.write_json(f)
+        print(cpu.profile.heatmap(), file=sys.stderr)
+
+if result.reason == TRAPPED:
+    print(f"Unknown instruction: {result.opcode:>08b}")
+    sys.exit(1)
+elif result.reason == FAULTED:
+    print(f"Fault at {result.pc:02X}: instruction {result.opcode:>08b}")
+    sys.exit(1)
@@ -0,0 +1,80 @@
+"""Execution profile of an LS-8 run: counters and their JSON/heatmap views."""
+
+import json
+from array import array
+
+from cpu import *
+
+# Heatmap shades, coldest first; a blank cell never ran
+SHADES = " .:-=+*#%@"
+
+
+class Profile:
+    """
+    Counters for a profiled run, each a 256-entry array of 64-bit counts:
+    opcodes (retired instructions by opcode byte), addresses (by pc),
+    calls (CALL targets), and taken/not_taken (conditional jumps by pc).
+
+    Attach one with cpu.profile = Profile(); counts accumulate across runs
+    until reset().
+    """
+
+    def __init__(self):
+        self.opcodes = array('Q', bytes(8 * 256))
+        self.addresses = array('Q', bytes(8 * 256))
+        self.calls = array('Q', bytes(8 * 256))
+        self.taken = array('Q', bytes(8 * 256))
+        self.not_taken = array('Q', bytes(8 * 256))
+
+    def reset(self):
+        for counts in (self.opcodes, self.addresses, self.calls, self.taken,
+                       self.not_taken):
+            counts[:] = array('Q', bytes(8 * 256))
+
+    def instructions(self):
+        """Total instructions retired."""
+        return sum(self.opcodes)
+
+    def to_dict(self):
+        """The nonzero counts, keyed by mnemonic or two-digit hex address."""
+        def by_address(counts):
+            return {f"{address:02X}": n for address, n in enumerate(counts)
+                    if n}
+
+        return {
+            "instructions": self.instructions(),
+            "opcodes": {MNEMONICS.get(op, f"{op:08b}"): n
+                        for op, n in enumerate(self.opcodes) if n},
+            "addresses": by_address(self.addresses),
+            "calls": by_address(self.calls),
+            "branches": {f"{pc:02X}": {"taken": self.taken[pc],
+                                       "not_taken": self.not_taken[pc]}
+                         for pc in range(256)
+                         if self.taken[pc] or self.not_taken[pc]},
+        }
+
+    def write_json(self, f):
+        json.dump(self.to_dict(), f, indent=2)
+        f.write("\n")
+
+    def heatmap(self):
+        """
+        Text map of the address space, 16 rows of 16 bytes, each cell
+        shaded by its execution count on a log scale against the hottest
+        address.
+        """
+        hottest = max(self.addresses)
+        lines = ["    " + " ".join(f"{col:X}" for col in range(16))]
+        for row in range(16):
+            cells = []
+            for col in range(16):
+                n = self.addresses[row * 16 + col]
+                if n == 0:
+                    cells.append(" ")
+                else:
+                    # 1..hottest maps onto shades 1..9
+                    shade = 1 + (len(SHADES) - 2) * n.bit_length() // \
+                        hottest.bit_length()
+                    cells.append(SHADES[shade])
+            lines.append(f"{row * 16:02X}  " + " ".join(cells))
+        return "\n".join(lines)
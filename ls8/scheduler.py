@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Scheduler: multiplexes many LS-8 machines on one asyncio event loop.
+
+Usage: scheduler.py [options] program [program ...]
+
+Runs every program (each --copies times) on one loop until they all stop
+or --duration seconds pass, then prints one JSON result per machine.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from cpu import *
+from devices import WallTimer
+from sinks import MemorySink
+
+
+class Scheduler:
+    """
+    Runs CPUs as tasks on the current event loop. Runnable machines take
+    turns of quantum instructions each, round robin, since the loop runs
+    ready tasks in the order they yielded. A machine waiting for an
+    interrupt is parked on its devices and takes no turns until its timer
+    is due or a key arrives.
+    """
+
+    def __init__(self, quantum=1024):
+        self.quantum = quantum
+        # task -> CPU, in spawn order
+        self.machines = {}
+
+    def spawn(self, cpu, max_steps=None, name=None):
+        """
+        Start running cpu from its current state. Returns its task, whose
+        result is the RunResult.
+        """
+        task = asyncio.create_task(cpu.run_async(self.quantum, max_steps),
+                                   name=name)
+        self.machines[task] = cpu
+        return task
+
+    def runnable(self):
+        """CPUs still running that are not parked."""
+        return [cpu for task, cpu in self.machines.items()
+                if not task.done() and not cpu.parked]
+
+    def parked(self):
+        """CPUs waiting for an interrupt."""
+        return [cpu for task, cpu in self.machines.items()
+                if not task.done() and cpu.parked]
+
+    async def join(self, timeout=None):
+        """
+        Wait for every machine to stop, or cancel the rest after timeout
+        seconds. Returns the RunResults in spawn order, None for machines
+        that were cancelled.
+        """
+        tasks = list(self.machines)
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return [None if task.cancelled() else task.result() for task in tasks]
+
+
+async def run_programs(programs, copies, quantum, engine, duration):
+    """Load and run every program copies times on one loop."""
+    scheduler = Scheduler(quantum)
+    machines = []
+    for program in programs:
+        for copy in range(copies):
+            cpu = CPU(engine, output=MemorySink(), timer=WallTimer())
+            cpu.load(program)
+            scheduler.spawn(cpu, name=f"{program}#{copy}")
+            machines.append((program, copy, cpu))
+
+    start = time.perf_counter()
+    results = await scheduler.join(duration)
+    elapsed = time.perf_counter() - start
+
+    for (program, copy, cpu), result in zip(machines, results):
+        print(json.dumps({
+            "program": program,
+            "copy": copy,
+            "status": "running" if result is None else result.reason,
+            "stdout": cpu.output.getvalue(),
+            "idle_time": round(cpu.idle_time, 6),
+            "wall_time": round(elapsed, 6),
+        }))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Run many LS-8 programs on one event loop.")
+    parser.add_argument("programs", nargs="+")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="machines to run per program")
+    parser.add_argument("--quantum", type=int, default=1024,
+                        help="instructions per turn")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="stop machines still running after this many "
+                             "seconds")
+    parser.add_argument("--engine", choices=ENGINES, default=CACHED)
+    args = parser.parse_args(argv[1:])
+
+    asyncio.run(run_programs(args.programs, args.copies, args.quantum,
+                             args.engine, args.duration))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,102 @@
+"""Output sinks for PRN/PRA."""
+
+import sys
+import time
+
+
+class StdoutSink:
+    """
+    Buffers output and writes it to a file (stdout by default) once the
+    buffer holds buffer_size characters, or on the first write after
+    flush_interval seconds have passed since the last flush. With
+    line_buffering, every write that ends a line is flushed at once; it
+    defaults to whether the file is a terminal, as it does for
+    sys.stdout, so a program that prints and then computes shows its
+    output straight away.
+    """
+
+    def __init__(self, file=None, buffer_size=8192, flush_interval=0.05,
+                 line_buffering=None):
+        # None means whatever sys.stdout is at flush time
+        self.file = file
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        # None means decide on the first write
+        self.line_buffering = line_buffering
+        self.buffer = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.size += len(text)
+        line_buffering = self.line_buffering
+        if line_buffering is None:
+            file = self.file if self.file is not None else sys.stdout
+            isatty = getattr(file, "isatty", None)
+            line_buffering = self.line_buffering = bool(isatty and isatty())
+        if ((line_buffering and text.endswith("\n")) or
+                self.size >= self.buffer_size or
+                time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            file = self.file if self.file is not None else sys.stdout
+            file.write("".join(self.buffer))
+            file.flush()
+            self.buffer = []
+            self.size = 0
+        self.last_flush = time.monotonic()
+
+
+class StreamSink:
+    """
+    Writes output to an asyncio StreamWriter, for CPUs sharing an event
+    loop. Text goes to the transport's buffer on flush(); CPU.run_async
+    awaits drain() between quanta so a slow reader holds back only its
+    own machine.
+    """
+
+    def __init__(self, writer, encoding="utf-8"):
+        self.writer = writer
+        self.encoding = encoding
+        self.buffer = []
+
+    def write(self, text):
+        self.buffer.append(text)
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write("".join(self.buffer).encode(self.encoding))
+            self.buffer = []
+
+    async def drain(self):
+        self.flush()
+        await self.writer.drain()
+
+
+class MemorySink:
+    """Collects output in memory, for tests and fleets."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+
+class NullSink:
+    """Discards output, for benchmarking."""
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
@@ -0,0 +1,84 @@
+"""Binary ring-buffer instruction tracer for the LS-8."""
+
+import struct
+import sys
+
+from cpu import *
+
+# One record per instruction, taken before it runs: pc, the three bytes at
+# pc (opcode and operands), FL, then R0-R7
+RECORD = struct.Struct("13B")
+
+
+class Tracer:
+    """
+    Keeps the last size instructions a CPU executed as fixed-size binary
+    records in a preallocated circular buffer. Nothing is formatted until
+    dump(), which also runs by itself when a traced run ends for one of the
+    dump_on reasons.
+
+    Attach one with cpu.tracer = Tracer(). symbols, the {name: address}
+    table from image.read_symbols(), adds labels and disassembly to dumps.
+    """
+
+    record = RECORD
+
+    def __init__(self, size=4096, file=None, symbols=None,
+                 dump_on=(HALTED, TRAPPED, FAULTED)):
+        self.size = size
+        self.buffer = bytearray(RECORD.size * size)
+        # slot the next record goes in
+        self.next = 0
+        # True once the buffer has wrapped and every slot holds a record
+        self.full = False
+        # where dumps go; None means sys.stderr at dump time
+        self.file = file
+        self.symbols = symbols
+        self.dump_on = dump_on
+
+    def clear(self):
+        self.next = 0
+        self.full = False
+
+    def records(self):
+        """The records held, oldest first, as 13-tuples."""
+        start = self.next if self.full else 0
+        count = self.size if self.full else self.next
+        for i in range(count):
+            slot = (start + i) % self.size
+            yield RECORD.unpack_from(self.buffer, slot * RECORD.size)
+
+    def stopped(self, result):
+        """Called with the result of every traced run."""
+        if result.reason in self.dump_on:
+            self.dump()
+
+    def dump(self, file=None):
+        """Write every record held, oldest first."""
+        if file is None:
+            file = self.file if self.file is not None else sys.stderr
+        labels = {}
+        if self.symbols:
+            for name, address in self.symbols.items():
+                labels.setdefault(address, name)
+
+        for record in self.records():
+            pc = record[0]
+            if pc in labels:
+                print(f"{labels[pc]}:", file=file)
+            print(format_record(record, labels if self.symbols else None),
+                  file=file)
+
+
+def format_record(record, labels=None):
+    """
+    One record in CPU.trace() layout. Given an {address: label} table,
+    the instruction is disassembled after it.
+    """
+    pc, opcode, a, b, flag = record[:5]
+    line = "TRACE: %02X | %02X %02X %02X |" % (pc, opcode, a, b)
+    line += "".join(" %02X" % r for r in record[5:])
+    if labels is not None:
+        line += "  " + disassemble(opcode, a, b, labels)
+    return line
+
@@ -0,0 +1,48 @@
+import glob
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the emulator and the assembler are flat modules run from their own
+# directories; put both on the path the way running them there would
+sys.path.insert(0, os.path.join(ROOT, "asm"))
+sys.path.insert(0, os.path.join(ROOT, "ls8"))
+
+from isa import FORMS, INSTRUCTIONS, SIZES  # noqa: E402
+
+EXAMPLES_DIR = os.path.join(ROOT, "ls8", "examples")
+
+# every example program, as paths
+EXAMPLES = sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.ls8")))
+
+OPCODES = [code for name, code, form in INSTRUCTIONS]
+
+# I0 handler address lives at 0xF8, as in cpu.py
+INTERRUPT_VECTORS = 0xF8
+
+
+def example(name):
+    """Path of the example program called name."""
+    return os.path.join(EXAMPLES_DIR, name)
+
+
+def random_program(rng):
+    """
+    256 bytes of random instructions, mostly naming real registers, with
+    a random vector for each interrupt an INT can raise.
+    """
+    ram = bytearray(256)
+    pc = 0
+    while pc < 240:
+        opcode = rng.choice(OPCODES)
+        ram[pc] = opcode
+        for i in range(1, SIZES[opcode]):
+            if FORMS[opcode] == "ri" and i == 2 or rng.random() < 0.1:
+                ram[pc + i] = rng.randrange(256)
+            else:
+                ram[pc + i] = rng.randrange(8)
+        pc += SIZES[opcode]
+    for n in range(8):
+        ram[INTERRUPT_VECTORS + n] = rng.randrange(0, 240)
+    return bytes(ram)
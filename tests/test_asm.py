@@ -0,0 +1,18 @@
+import pytest
+
+from asm import AsmError, assemble
+from cpu import *
+from sinks import MemorySink
+
+
+def test_assemble_and_load_image():
+    cpu = CPU(output=MemorySink())
+    image = assemble("LDI R0,8\nPRN R0\nHLT\n")
+    assert cpu.load_image(image) == 6
+    assert cpu.run().reason == HALTED
+    assert cpu.output.getvalue() == "8\n"
+
+
+def test_program_too_big_for_ram():
+    with pytest.raises(AsmError):
+        assemble(["LDI R0,1"] * 90)
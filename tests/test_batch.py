@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from conftest import random_program
+from cpu import *
+from sinks import MemorySink
+
+pytest.importorskip("numpy")
+
+from batch import run_batch  # noqa: E402
+
+
+def run_cpu(image, max_steps):
+    cpu = CPU(INTERPRETER, output=MemorySink())
+    cpu.ram[:] = image
+    cpu.flush()
+    result = cpu.run(max_steps)
+    return (result.reason, result.instructions, cpu.output.getvalue(),
+            bytes(cpu.ram), bytes(cpu.reg), cpu.pc, cpu.flag,
+            cpu.interrupts_enabled)
+
+
+def test_batch_matches_cpu():
+    rng = random.Random(6)
+    images = [random_program(rng) for _ in range(500)]
+    m = run_batch(images, 200)
+    reasons = set()
+    for i, image in enumerate(images):
+        expected = run_cpu(image, 200)
+        got = (m.reason(i), int(m.steps[i]), m.output[i], m.ram[i].tobytes(),
+               m.reg[i].tobytes(), int(m.pc[i]), int(m.fl[i]),
+               bool(m.enabled[i]))
+        assert got == expected, i
+        reasons.add(got[0])
+    assert reasons == {BUDGET, HALTED, TRAPPED, FAULTED}
+
+
+@pytest.mark.parametrize("source", [
+    # PUSH R7 pushes the decremented SP, POP R7 leaves the value plus one
+    [PUSH, 7, POP, 7, HLT],
+    # INT 1 with IM set enters the handler, which returns with IRET
+    [LDI, 5, 2, LDI, 0, 1, INT, 0, PRN, 0, HLT, IRET],
+])
+def test_stack_and_interrupts(source):
+    image = bytearray(256)
+    image[:len(source)] = bytes(source)
+    image[INTERRUPT_VECTORS + 1] = 11
+    m = run_batch([image], 50)
+    expected = run_cpu(image, 50)
+    assert (m.reason(0), int(m.steps[0]), m.output[0],
+            m.reg[0].tobytes()) == (expected[0], expected[1], expected[2],
+                                    expected[4])
@@ -0,0 +1,64 @@
+import glob
+import io
+import os
+
+import asm
+import build
+
+SOURCES = sorted(glob.glob(os.path.join(build.HERE, "*.asm")))
+
+
+def run(tmp_path, *args):
+    return build.main(["build.py", "-q", "-j", "1",
+                       "-o", str(tmp_path / "out"),
+                       "--cache", str(tmp_path / "cache"), *args])
+
+
+def counts(tmp_path):
+    os.makedirs(tmp_path / "out", exist_ok=True)
+    cache = build.Cache(str(tmp_path / "cache"))
+    return build.build(SOURCES, str(tmp_path / "out"), cache, workers=1)
+
+
+def test_outputs_match_asm(tmp_path):
+    assert run(tmp_path, *SOURCES) == 0
+    for source in SOURCES:
+        name = os.path.splitext(os.path.basename(source))[0]
+        expected = io.StringIO()
+        with open(source) as f:
+            asm.write_text(expected, asm.assemble_lines(f))
+        with open(tmp_path / "out" / f"{name}.ls8") as f:
+            assert f.read() == expected.getvalue()
+
+
+def test_noop_rebuild(tmp_path):
+    assembled, copied, fresh, errors = counts(tmp_path)
+    assert (assembled, fresh, errors) == (len(SOURCES), 0, [])
+    assert counts(tmp_path) == (0, 0, len(SOURCES), [])
+
+
+def test_deleted_output_comes_from_cache(tmp_path):
+    counts(tmp_path)
+    os.remove(tmp_path / "out" / "print8.ls8")
+    assert counts(tmp_path) == (0, 1, len(SOURCES) - 1, [])
+
+
+def test_version_bump_rebuilds(tmp_path, monkeypatch):
+    counts(tmp_path)
+    monkeypatch.setattr(asm, "ASSEMBLER_VERSION", asm.ASSEMBLER_VERSION + 1)
+    assert counts(tmp_path) == (len(SOURCES), 0, 0, [])
+    assert counts(tmp_path) == (0, 0, len(SOURCES), [])
+
+
+def test_instruction_set_change_rebuilds(tmp_path, monkeypatch):
+    counts(tmp_path)
+    monkeypatch.setattr(asm, "INSTRUCTIONS",
+                        asm.INSTRUCTIONS + [("XYZ", 0xFE, "")])
+    assert counts(tmp_path)[0] == len(SOURCES)
+
+
+def test_error_reported(tmp_path):
+    bad = tmp_path / "bad.asm"
+    bad.write_text("BOGUS R0\n")
+    assert run(tmp_path, str(bad)) == 1
+    assert not (tmp_path / "out" / "bad.ls8").exists()
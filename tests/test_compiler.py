@@ -0,0 +1,25 @@
+import pytest
+
+from cpu import *
+from sinks import MemorySink
+
+
+def run(code, engine):
+    cpu = CPU(engine, output=MemorySink())
+    cpu.ram[:len(code)] = bytes(code)
+    cpu.flush()
+    result = cpu.run(100)
+    return (result.reason, result.pc, result.instructions,
+            cpu.output.getvalue(), bytes(cpu.reg))
+
+
+@pytest.mark.parametrize("code", [
+    # LDI R0,5; PRN R0; CMP R0,R0; JGT R32 (not taken); PRN R0; HLT
+    [LDI, 0, 5, PRN, 0, CMP, 0, 0, JGT, 32, PRN, 0, HLT],
+    # LDI R0,5; PRN R0; LDI R1,9; ADD R1,R9; HLT
+    [LDI, 0, 5, PRN, 0, LDI, 1, 9, ADD, 1, 9, HLT],
+    # LDI R1,1; JMP R12
+    [LDI, 1, 1, JMP, 12],
+])
+def test_bad_register_matches_interpreter(code):
+    assert run(code, COMPILED) == run(code, INTERPRETER)
@@ -0,0 +1,24 @@
+import os
+
+from conftest import example
+from cpu import *
+from devices import Keyboard
+from sinks import MemorySink
+
+
+def test_keyboard_only_guest_goes_idle():
+    r, w = os.pipe()
+    keyboard = Keyboard(os.fdopen(r))
+    cpu = CPU(keyboard=keyboard, output=MemorySink())
+    cpu.load(example("keyboard.ls8"))
+    try:
+        result = cpu.run(block=False)
+        assert result.reason == IDLE
+
+        os.write(w, b"k")
+        keyboard.wait(5)
+        cpu.run(max_steps=10000, block=False)
+        assert cpu.output.getvalue() == "k"
+    finally:
+        os.close(w)
+        keyboard.close()
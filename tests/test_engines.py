@@ -0,0 +1,118 @@
+"""
+The engines are interchangeable: every engine, run whole, on a budget or
+in chunks, stops for the same reason at the same place as the interpreter
+and leaves the same output and machine state behind.
+"""
+
+import os
+import random
+
+import pytest
+
+import aot
+from conftest import EXAMPLES, random_program
+from cpu import *
+from devices import VirtualTimer
+from sinks import MemorySink
+
+# keyboard.ls8 never halts on its own
+BUDGET_STEPS = 20000
+
+CHUNKS = [1, 2, 3, 5, 7, 11, 64, 100, 1000]
+
+
+def make_cpu(ram, engine, timer=None, translation_dir=None):
+    cpu = CPU(INTERPRETER if engine == "aot" else engine,
+              output=MemorySink(), timer=timer)
+    cpu.ram[:] = ram
+    cpu.flush()
+    if engine == "aot":
+        aot.write_translation(cpu.ram, translation_dir)
+        aot.install(cpu, aot.load_translation(cpu.ram, translation_dir))
+    return cpu
+
+
+def state(cpu, results):
+    return ([(r.reason, r.pc, r.opcode, r.instructions) for r in results],
+            cpu.output.getvalue(), bytes(cpu.ram), bytes(cpu.reg), cpu.pc,
+            cpu.flag, cpu.interrupts_enabled)
+
+
+def run_whole(cpu, max_steps=BUDGET_STEPS):
+    return state(cpu, [cpu.run(max_steps)])
+
+
+def run_chunked(cpu, chunks, max_steps=BUDGET_STEPS):
+    """Run in chunks until the CPU stops or max_steps have run."""
+    results = []
+    steps = 0
+    for n in chunks * (max_steps // sum(chunks) + 1):
+        n = min(n, max_steps - steps)
+        result = cpu.run(n)
+        steps += result.instructions
+        results.append(result)
+        if result.reason != BUDGET or steps == max_steps:
+            break
+    # chunk boundaries differ between engines only in where budgets ran
+    # out, so compare the last result and the total
+    last = results[-1]
+    last.instructions = steps
+    return state(cpu, [last])
+
+
+def load_example(path):
+    cpu = CPU()
+    cpu.load(path)
+    return bytes(cpu.ram)
+
+
+ENGINE_VARIANTS = [CACHED, COMPILED, "aot"]
+
+
+@pytest.mark.parametrize("engine", ENGINE_VARIANTS)
+@pytest.mark.parametrize("path", EXAMPLES, ids=os.path.basename)
+def test_examples(path, engine, tmp_path):
+    ram = load_example(path)
+    expected = run_whole(make_cpu(ram, INTERPRETER))
+    assert run_whole(make_cpu(ram, engine, translation_dir=tmp_path)) == \
+        expected
+    chunked = run_chunked(make_cpu(ram, engine, translation_dir=tmp_path),
+                          CHUNKS)
+    assert chunked == expected
+
+
+@pytest.mark.parametrize("engine", ENGINE_VARIANTS)
+@pytest.mark.parametrize("path", EXAMPLES, ids=os.path.basename)
+def test_examples_with_timer(path, engine, tmp_path):
+    ram = load_example(path)
+    expected = run_whole(make_cpu(ram, INTERPRETER, VirtualTimer(500)))
+    cpu = make_cpu(ram, engine, VirtualTimer(500), tmp_path)
+    assert run_whole(cpu) == expected
+    cpu = make_cpu(ram, engine, VirtualTimer(500), tmp_path)
+    assert run_chunked(cpu, CHUNKS) == expected
+
+
+@pytest.mark.parametrize("engine", [CACHED, COMPILED])
+def test_random_programs(engine):
+    rng = random.Random(3)
+    for _ in range(300):
+        ram = random_program(rng)
+        chunks = [rng.randrange(1, 40) for _ in range(6)]
+        expected = run_chunked(make_cpu(ram, INTERPRETER), chunks, 300)
+        assert run_chunked(make_cpu(ram, engine), chunks, 300) == expected
+
+
+@pytest.mark.parametrize("engine", [INTERPRETER, CACHED, COMPILED])
+def test_reset_reuses_buffers(engine):
+    # runs every example after another on one CPU, each after a reset,
+    # and checks each against a fresh CPU
+    cpu = CPU(engine, output=MemorySink())
+    buffers = [cpu.ram, cpu.reg, cpu.decoded, cpu.fused, cpu.blocks]
+    for path in EXAMPLES + EXAMPLES[:1]:
+        cpu.reset()
+        cpu.output = MemorySink()
+        cpu.load(path)
+        assert run_whole(cpu) == run_whole(make_cpu(load_example(path),
+                                                    engine))
+        now = [cpu.ram, cpu.reg, cpu.decoded, cpu.fused, cpu.blocks]
+        assert all(a is b for a, b in zip(now, buffers))
@@ -0,0 +1,25 @@
+import io
+import json
+import shutil
+
+from conftest import example
+from cpu import *
+from fleet import ERROR, read_jobs, run_fleet
+
+
+def test_bad_jobs_do_not_stop_the_fleet(tmp_path):
+    shutil.copy(example("print8.ls8"), tmp_path / "good.ls8")
+    (tmp_path / "garbage.ls8").write_text("hello\n")
+    (tmp_path / "huge.ls8").write_text("00000000\n" * 300)
+    (tmp_path / "truncated.ls8b").write_bytes(b"LS8")
+
+    out = io.StringIO()
+    run_fleet(read_jobs(str(tmp_path), 1000, 5.0), out, workers=1)
+    records = {r["id"].rsplit("/", 1)[-1]: r
+               for r in map(json.loads, out.getvalue().splitlines())}
+
+    assert records["good.ls8"]["status"] == HALTED
+    assert records["good.ls8"]["stdout"] == "8\n"
+    for name in ("garbage.ls8", "huge.ls8", "truncated.ls8b"):
+        assert records[name]["status"] == ERROR
+        assert records[name]["exit_code"] == 2
@@ -0,0 +1,71 @@
+"""ls8.py --headless runs on virtual time, so its output never varies."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from asm import assemble
+from conftest import ROOT
+from image import write_image
+
+# prints "." on every timer tick and echoes keys until a "q"
+TICKS_AND_KEYS = """
+    LDI R0,0xF8
+    LDI R1,TICK
+    ST R0,R1
+    LDI R0,0xF9
+    LDI R1,KEY
+    ST R0,R1
+    LDI R5,3        ; timer and keyboard
+    LDI R0,LOOP
+LOOP:
+    JMP R0
+TICK:
+    LDI R0,46       ; "."
+    PRA R0
+    IRET
+KEY:
+    LDI R0,0xF4
+    LD R1,R0
+    PRA R1
+    LDI R2,113      ; "q"
+    CMP R1,R2
+    LDI R3,STOP
+    JEQ R3
+    IRET
+STOP:
+    HLT
+"""
+
+KEYS = b"hello, world q"
+
+
+def run_headless(*args):
+    command = [sys.executable, os.path.join(ROOT, "ls8", "ls8.py"),
+               *map(str, args)]
+    done = subprocess.run(command, input=KEYS, capture_output=True,
+                          timeout=30)
+    assert done.returncode == 0, done.stderr
+    return done.stdout.decode()
+
+
+@pytest.fixture
+def program(tmp_path):
+    image = assemble(TICKS_AND_KEYS)
+    path = tmp_path / "ticks.ls8b"
+    with open(path, "wb") as f:
+        write_image(f, image.code, image.symbols)
+    return path
+
+
+@pytest.mark.parametrize("tick", ["7", "50"])
+def test_same_output_every_run(program, tick):
+    first = run_headless("--headless", "--tick", tick, program)
+    assert first.replace(".", "") == KEYS.decode()
+    assert "." in first
+    # the filename may come after --headless or before the options
+    for args in [("--headless", "--tick", tick, program),
+                 (program, "--tick", tick, "--headless")]:
+        assert run_headless(*args) == first
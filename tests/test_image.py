@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from cpu import *
+from image import (HEADER, MAGIC, VERSION, Image, is_image, load_image,
+                   read_symbols, write_image)
+
+CODE = bytes([LDI, 0, 8, PRN, 0, HLT])
+SYMBOLS = {"start": 0, "print": 3}
+
+
+def write(path, code=CODE, symbols=SYMBOLS):
+    with open(path, "wb") as f:
+        write_image(f, code, symbols)
+    return str(path)
+
+
+def test_round_trip(tmp_path):
+    path = write(tmp_path / "p.ls8b")
+    assert is_image(path)
+    ram = bytearray(256)
+    assert load_image(path, ram) == len(CODE)
+    assert bytes(ram[:len(CODE)]) == CODE
+    assert read_symbols(path) == SYMBOLS
+
+
+def test_round_trip_without_symbols(tmp_path):
+    path = write(tmp_path / "p.ls8b", symbols=None)
+    assert read_symbols(path) == {}
+
+
+def test_cpu_loads_both_formats(tmp_path):
+    text = tmp_path / "p.ls8"
+    text.write_text("".join(f"{byte:08b} # comment\n\n" for byte in CODE))
+    for path in (write(tmp_path / "p.ls8b"), str(text)):
+        cpu = CPU()
+        assert cpu.load(path) == len(CODE)
+        assert bytes(cpu.ram[:len(CODE)]) == CODE
+
+
+def test_truncated_header(tmp_path):
+    path = tmp_path / "p.ls8b"
+    path.write_bytes(MAGIC + bytes([VERSION]))
+    with pytest.raises(ValueError, match="truncated"):
+        load_image(str(path), bytearray(256))
+
+
+def test_truncated_code(tmp_path):
+    path = tmp_path / "p.ls8b"
+    path.write_bytes(HEADER.pack(MAGIC, VERSION, 0, 10) + bytes(4))
+    with pytest.raises(ValueError, match="truncated"):
+        load_image(str(path), bytearray(256))
+
+
+def test_bad_version(tmp_path):
+    path = tmp_path / "p.ls8b"
+    path.write_bytes(HEADER.pack(MAGIC, VERSION + 1, 0, 1) + bytes(1))
+    with pytest.raises(ValueError, match="version"):
+        load_image(str(path), bytearray(256))
+    with pytest.raises(ValueError, match="version"):
+        read_symbols(str(path))
+
+
+def test_too_big(tmp_path):
+    with pytest.raises(ValueError):
+        write_image(io.BytesIO(), bytes(257))
+    with pytest.raises(ValueError):
+        Image(bytes(257))
+    path = tmp_path / "p.ls8b"
+    path.write_bytes(HEADER.pack(MAGIC, VERSION, 0, 257) + bytes(257))
+    with pytest.raises(ValueError, match="257 bytes"):
+        CPU().load(str(path))
+
+
+def test_oversized_text_program(tmp_path):
+    path = tmp_path / "p.ls8"
+    path.write_text("00000000\n" * 300)
+    with pytest.raises(ValueError, match="300 bytes, RAM is 256"):
+        CPU().load(str(path))
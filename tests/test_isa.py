@@ -0,0 +1,82 @@
+import pytest
+
+from asm import assemble
+from cpu import *
+from sinks import MemorySink
+
+ALU_PROGRAM = """
+    LDI R0,200
+    LDI R1,7
+    LDI R2,3
+    SUB R0,R1
+    PRN R0
+    DIV R0,R2
+    PRN R0
+    MOD R1,R2
+    PRN R1
+    INC R1
+    DEC R2
+    PRN R1
+    PRN R2
+    AND R0,R2
+    PRN R0
+    LDI R0,0x5A
+    OR R0,R2
+    PRN R0
+    XOR R0,R1
+    PRN R0
+    NOT R0
+    PRN R0
+    SHL R0,R2
+    PRN R0
+    SHR R0,R1
+    PRN R0
+    NOP
+    LDI R3,0
+    SUB R3,R2
+    PRN R3
+    HLT
+"""
+
+
+def run(source, engine):
+    cpu = CPU(engine, output=MemorySink())
+    cpu.load_image(assemble(source))
+    return cpu.run(), cpu.output.getvalue()
+
+
+def test_every_instruction_has_a_handler():
+    cpu = CPU()
+    for name, code, form in INSTRUCTIONS:
+        assert cpu.branchtable[code] == getattr(cpu, f"handle_{name.lower()}")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_alu(engine):
+    result, output = run(ALU_PROGRAM, engine)
+    assert result.reason == HALTED
+    assert output.split() == ["193", "64", "1", "2", "2", "0", "90", "88",
+                              "167", "156", "39", "254"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("op", ["DIV", "MOD"])
+def test_divide_by_zero_faults(engine, op):
+    result, output = run(f"LDI R0,1\nLDI R1,0\n{op} R0,R1\nHLT\n", engine)
+    assert (result.reason, result.pc, result.instructions) == (FAULTED, 6, 2)
+
+
+@pytest.mark.parametrize("op", ["ADD", "SUB", "MUL", "DIV", "MOD", "INC",
+                                "DEC", "AND", "OR", "XOR", "NOT", "SHL",
+                                "SHR"])
+def test_handlers_match_alu(op):
+    # the handlers inline alu()'s arithmetic, so the two must agree
+    inline, reference = CPU(), CPU()
+    handler = getattr(inline, f"handle_{op.lower()}")
+    for x in [0, 1, 2, 7, 127, 128, 200, 255]:
+        for y in [1, 2, 3, 8, 128, 255]:
+            inline.reg[0] = reference.reg[0] = x
+            inline.reg[1] = reference.reg[1] = y
+            assert handler(0, 1, 42) == 42
+            reference.alu(op, 0, 1)
+            assert inline.reg == reference.reg
@@ -0,0 +1,27 @@
+import io
+
+import pytest
+
+from conftest import example
+from cpu import *
+from profiler import Profile
+from sinks import MemorySink
+from tracer import Tracer
+
+
+def profile(name, traced):
+    cpu = CPU(output=MemorySink())
+    cpu.load(example(name))
+    cpu.profile = Profile()
+    if traced:
+        cpu.tracer = Tracer(8, file=io.StringIO())
+    result = cpu.run()
+    return result, cpu.profile.to_dict()
+
+
+@pytest.mark.parametrize("name", ["sctest.ls8", "call.ls8", "stack.ls8"])
+def test_traced_runs_are_profiled(name):
+    result, counts = profile(name, traced=False)
+    traced_result, traced_counts = profile(name, traced=True)
+    assert counts["instructions"] == result.instructions
+    assert traced_counts == counts
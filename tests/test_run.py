@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+from conftest import example
+from cpu import *
+from devices import VirtualTimer
+from profiler import Profile
+from sinks import MemorySink
+from tracer import Tracer
+
+# where interrupts.ls8 keeps its timer handler
+INT_HANDLER = 0x11
+
+
+def make_cpu(name, engine=CACHED, timer=None):
+    cpu = CPU(engine, output=MemorySink(), timer=timer)
+    cpu.load(example(name))
+    return cpu
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_step_matches_run(engine):
+    whole = make_cpu("sctest.ls8", engine)
+    expected = whole.run()
+
+    stepped = make_cpu("sctest.ls8", engine)
+    retired = 0
+    while True:
+        result = stepped.step()
+        retired += result.instructions
+        if result.reason != BUDGET:
+            break
+        assert result.instructions == 1
+    assert (result.reason, result.pc, retired) == \
+        (expected.reason, expected.pc, expected.instructions)
+    assert stepped.output.getvalue() == whole.output.getvalue()
+    assert bytes(stepped.reg) == bytes(whole.reg)
+
+
+def test_step_n():
+    cpu = make_cpu("mult.ls8")
+    result = cpu.step(3)
+    assert (result.reason, result.instructions) == (BUDGET, 3)
+    # LDI, LDI, MUL: next up is PRN
+    assert cpu.pc == 9 and cpu.reg[0] == 72
+
+
+def test_run_until():
+    cpu = make_cpu("call.ls8")
+    expected = make_cpu("call.ls8").run()
+    result = cpu.run_until(expected.pc)
+    assert (result.reason, result.pc) == (REACHED, expected.pc)
+    assert result.instructions == expected.instructions - 1
+    # resuming finishes the run
+    assert cpu.run().reason == HALTED
+
+
+def test_run_until_budget_and_halt():
+    cpu = make_cpu("print8.ls8")
+    result = cpu.run_until(0xFF, max_steps=1)
+    assert (result.reason, result.instructions) == (BUDGET, 1)
+    result = cpu.run_until(0xFF)
+    assert result.reason == HALTED
+
+
+@pytest.mark.parametrize("max_steps", [None, 100000])
+def test_run_until_with_timer(max_steps):
+    timer = VirtualTimer(100)
+    cpu = make_cpu("interrupts.ls8", timer=timer)
+    result = cpu.run_until(INT_HANDLER, max_steps)
+    assert (result.reason, result.pc) == (REACHED, INT_HANDLER)
+    assert result.instructions == 100
+    # the handler prints an A
+    cpu.step(2)
+    assert cpu.output.getvalue() == "A"
+
+
+def test_run_until_traced_and_profiled():
+    cpu = make_cpu("call.ls8")
+    cpu.tracer = Tracer(4, file=io.StringIO())
+    cpu.profile = Profile()
+    result = cpu.run_until(0xFF, max_steps=10)
+    assert result.instructions == 10
+    assert cpu.profile.instructions() == 10
+    assert len(list(cpu.tracer.records())) == 4
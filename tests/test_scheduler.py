@@ -0,0 +1,70 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, example
+from cpu import *
+from devices import WallTimer
+from scheduler import Scheduler
+from sinks import MemorySink
+
+HALTING = ["call.ls8", "mult.ls8", "printstr.ls8", "sctest.ls8", "stack.ls8"]
+
+
+def make_cpu(name, timer=None):
+    cpu = CPU(output=MemorySink(), timer=timer)
+    cpu.load(example(name))
+    return cpu
+
+
+def test_importing_the_emulator_leaves_asyncio_alone():
+    # asyncio takes longer to import than the emulator itself
+    code = "import sys, ls8_modules; print('asyncio' in sys.modules)"
+    code = code.replace("ls8_modules", "cpu, devices, compiler, fusion")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                         text=True, cwd=os.path.join(ROOT, "ls8"), check=True)
+    assert out.stdout.strip() == "False"
+
+
+@pytest.mark.parametrize("name", HALTING)
+@pytest.mark.parametrize("quantum", [1, 7, 1024])
+def test_run_async_matches_run(name, quantum):
+    cpu = make_cpu(name)
+    expected = cpu.run()
+    machine = make_cpu(name)
+    result = asyncio.run(machine.run_async(quantum))
+    assert (result.reason, result.pc, result.instructions) == \
+        (expected.reason, expected.pc, expected.instructions)
+    assert machine.output.getvalue() == cpu.output.getvalue()
+
+
+def test_run_async_budget():
+    cpu = make_cpu("sctest.ls8")
+    result = asyncio.run(cpu.run_async(quantum=4, max_steps=10))
+    assert (result.reason, result.instructions) == (BUDGET, 10)
+
+
+def test_scheduler_runs_and_parks():
+    async def main():
+        scheduler = Scheduler(quantum=16)
+        machines = [make_cpu(name) for name in HALTING]
+        idle = make_cpu("interrupts.ls8", WallTimer(period=0.1))
+        for cpu in machines + [idle]:
+            scheduler.spawn(cpu)
+        await asyncio.sleep(0.05)
+        assert scheduler.parked() == [idle]
+        results = await scheduler.join(timeout=0.25)
+        return machines, idle, results
+
+    machines, idle, results = asyncio.run(main())
+    for name, cpu, result in zip(HALTING, machines, results):
+        expected = make_cpu(name)
+        assert result.reason == expected.run().reason == HALTED
+        assert cpu.output.getvalue() == expected.output.getvalue()
+    # the idle machine was cancelled, and waited for its ticks
+    assert results[-1] is None
+    assert idle.output.getvalue().startswith("AA")
+    assert idle.idle_time > 0.15
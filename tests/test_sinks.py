@@ -0,0 +1,33 @@
+import io
+
+from sinks import StdoutSink
+
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_terminal_is_line_buffered():
+    file = Terminal()
+    sink = StdoutSink(file, flush_interval=3600)
+    sink.write("7")
+    assert file.getvalue() == ""
+    sink.write("\n")
+    assert file.getvalue() == "7\n"
+
+
+def test_pipe_is_block_buffered():
+    file = io.StringIO()
+    sink = StdoutSink(file, flush_interval=3600)
+    sink.write("7\n")
+    assert file.getvalue() == ""
+    sink.flush()
+    assert file.getvalue() == "7\n"
+
+
+def test_line_buffering_can_be_forced():
+    file = io.StringIO()
+    sink = StdoutSink(file, flush_interval=3600, line_buffering=True)
+    sink.write("7\n")
+    assert file.getvalue() == "7\n"
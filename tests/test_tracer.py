@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+from asm import assemble
+from cpu import *
+from sinks import MemorySink
+from tracer import Tracer
+
+COUNTDOWN = """
+    LDI R0,2
+LOOP:
+    DEC R0
+    LDI R1,LOOP
+    CMP R0,R2
+    JNE R1
+    HLT
+"""
+
+
+def traced(source, size=64, **kwargs):
+    image = assemble(source)
+    cpu = CPU(output=MemorySink())
+    cpu.load_image(image)
+    cpu.tracer = Tracer(size, file=io.StringIO(), **kwargs)
+    return cpu, image
+
+
+def test_dump_layout():
+    cpu, image = traced(COUNTDOWN, size=4, dump_on=())
+    assert cpu.run().reason == HALTED
+    # nothing is written unless asked for
+    assert cpu.tracer.file.getvalue() == ""
+    out = io.StringIO()
+    cpu.tracer.dump(out)
+    # the last four instructions, oldest first, with R0-R7 before each
+    assert out.getvalue().splitlines() == [
+        "TRACE: 05 | 82 01 03 | 00 03 00 00 00 00 00 F4",
+        "TRACE: 08 | A7 00 02 | 00 03 00 00 00 00 00 F4",
+        "TRACE: 0B | 56 01 01 | 00 03 00 00 00 00 00 F4",
+        "TRACE: 0D | 01 00 00 | 00 03 00 00 00 00 00 F4",
+    ]
+
+
+def test_dump_with_symbols():
+    cpu, image = traced(COUNTDOWN, dump_on=())
+    cpu.tracer.symbols = image.symbols
+    cpu.run()
+    out = io.StringIO()
+    cpu.tracer.dump(out)
+    lines = out.getvalue().splitlines()
+    # a label line before each visit to LOOP, and disassembly throughout
+    assert lines[:4] == [
+        "TRACE: 00 | 82 00 02 | 00 00 00 00 00 00 00 F4  LDI R0,2",
+        "LOOP:",
+        "TRACE: 03 | 66 00 82 | 02 00 00 00 00 00 00 F4  DEC R0",
+        "TRACE: 05 | 82 01 03 | 01 00 00 00 00 00 00 F4  LDI R1,LOOP",
+    ]
+    assert lines.count("LOOP:") == 2
+    assert lines[-1].endswith("  HLT")
+
+
+@pytest.mark.parametrize("source, reason", [
+    (COUNTDOWN, HALTED),
+    # 0xFF is no instruction
+    ("LDI R0,1\nDB 0xFF\n", TRAPPED),
+    ("LDI R0,1\nLDI R1,0\nDIV R0,R1\nHLT\n", FAULTED),
+])
+def test_dumps_when_the_run_stops(source, reason):
+    cpu, image = traced(source)
+    result = cpu.run()
+    assert result.reason == reason
+    dumped = cpu.tracer.file.getvalue().splitlines()
+    # every instruction, up to the one that stopped the run; one that
+    # traps or faults is recorded but does not count as executed
+    assert len(dumped) == result.instructions + (reason != HALTED)
+    assert dumped[-1].startswith("TRACE: %02X | %02X" % (result.pc,
+                                                          result.opcode))
+
+
+def test_no_dump_on_budget():
+    cpu, image = traced(COUNTDOWN)
+    assert cpu.run(3).reason == BUDGET
+    assert cpu.tracer.file.getvalue() == ""